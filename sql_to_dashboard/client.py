@@ -9,7 +9,7 @@ from pathlib import Path
 from typing import List
 
 from schemas import GenerateRequest
-from server import SqlToDashboardServer
+from server import SqlToDashboardServer, read_ddl_file
 
 
 @click.command()
@@ -51,8 +51,7 @@ def generate(schema_file: str, intents: List[str], output_dir: str, database: st
     
     try:
         # Read DDL file
-        with open(schema_file, 'r') as f:
-            ddl = f.read()
+        ddl = read_ddl_file(schema_file)
         
         print(f"📄 Schema: {schema_file}")
         print(f"🎯 Intents: {', '.join(intents)}")
@@ -1,10 +1,14 @@
 """Dashboard template generator with D3.js - Version 2.0"""
 
+from functools import lru_cache
 
+
+@lru_cache(maxsize=128)
 def generate_dashboard_html(title: str = "Data Dashboard", theme: str = "light") -> str:
     """
     Generate a complete dashboard HTML that auto-loads data.json.
     D3.js handles all visualizations and transformations client-side.
+    Memoized: the page depends only on title and theme.
     """
     
     dark_mode_styles = """
@@ -1,8 +1,96 @@
 """Simplified LLM integration for SQL generation - Version 2.0"""
 
-import json
-import requests
-from typing import List, Optional
+import hashlib
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Shared keep-alive session, created on first use so importing this module
+# does not pull in requests/urllib3
+_SESSION = None
+
+# (base_url, model) pairs already confirmed available, shared across agents
+_VERIFIED_MODELS = set()
+
+# Master queries the LLM produced, keyed on a digest of the request and
+# shared across agents; oldest entries are evicted first
+_QUERY_CACHE: Dict[bytes, str] = {}
+_QUERY_CACHE_SIZE = 256
+
+_TABLE_RE = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([`"\']?)(\w+)\1', re.IGNORECASE)
+# Any CREATE ... TABLE statement, including the TEMP/bracketed ones _TABLE_RE misses
+_CREATE_TABLE_RE = re.compile(r'\bCREATE\s+(?:\w+\s+)*?TABLE\b', re.IGNORECASE)
+_FENCE_RE = re.compile(r'```(?:sql)?\s*', re.IGNORECASE)
+_SQL_VALIDATE_RE = re.compile(r'\s*(?:SELECT|WITH)\b.*?\bFROM\b', re.IGNORECASE | re.DOTALL)
+
+# Fixed instructions come first so Ollama can reuse its prompt KV-cache
+# across calls; per-request values follow.
+_MASTER_QUERY_TMPL = """You are a SQL expert. Generate a SINGLE comprehensive SQL query that joins ALL tables and returns ALL columns needed for data visualization.
+
+REQUIREMENTS:
+1. JOIN all tables based on foreign key relationships
+2. Use table aliases to avoid column name conflicts  
+3. Return ALL columns from ALL tables (use t1.*, t2.*, etc.)
+4. Do NOT aggregate - return raw data (D3.js will handle aggregations)
+5. Add LIMIT 10000 for performance
+6. Make sure the query is valid SQL syntax for the target database
+
+TARGET DATABASE: {database}
+
+DDL SCHEMA:
+{ddl}
+
+TABLES FOUND: {tables}
+
+USER WANTS TO ANALYZE: {intents}
+
+Return ONLY the SQL query, no explanation. The query should return flat, denormalized data that can be used for any visualization.
+
+SQL Query:"""
+
+
+# (connect, read) timeouts for Ollama requests
+_TIMEOUT = (3.05, 120)
+
+
+def _get_session():
+    """Return the shared pooled session, creating it on first call."""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        session = requests.Session()
+        # Retry transient 5xx while a model warms up; fail fast if Ollama is down.
+        # Never resend after a read timeout: the generation may still be running.
+        retry = Retry(total=3, connect=1, read=0, backoff_factor=0.3,
+                      status_forcelist=[502, 503, 504], allowed_methods=['GET', 'POST'])
+        session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        session.headers.update({'Connection': 'keep-alive'})
+        _SESSION = session
+    return _SESSION
+
+
+@lru_cache(maxsize=64)
+def _extract_table_names_cached(ddl: str) -> Tuple[str, ...]:
+    """Extract table names from DDL, memoized since one DDL serves many requests."""
+    return tuple(dict.fromkeys(match.group(2) for match in _TABLE_RE.finditer(ddl)))
+
+
+def extract_table_names(ddl: str) -> List[str]:
+    """Extract table names from DDL, in order of first appearance."""
+    return list(_extract_table_names_cached(ddl))
+
+
+@lru_cache(maxsize=64)
+def _is_single_plain_table(ddl: str) -> bool:
+    """True if ddl creates exactly one table whose unqualified name _TABLE_RE read."""
+    matches = list(_TABLE_RE.finditer(ddl))
+    if len(matches) != 1 or len(_CREATE_TABLE_RE.findall(ddl)) != 1:
+        return False
+    # "public.users" matches as "public"
+    return not ddl[matches[0].end():].lstrip().startswith('.')
 
 
 class LLMAgent:
@@ -11,23 +99,43 @@ class LLMAgent:
     def __init__(self, model: str = "llama3", base_url: str = "http://localhost:11434"):
         self.model = model
         self.base_url = base_url
+        self._verified = False
         self.verify_connection()
     
     def verify_connection(self) -> bool:
         """Check if Ollama is running and model is available."""
+        if self._verified or (self.base_url, self.model) in _VERIFIED_MODELS:
+            self._verified = True
+            return True
+        
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            session = _get_session()
+            # /api/show looks up a single model; only walk the full tag list
+            # if it fails (model missing, or an Ollama without /api/show)
+            response = session.post(f"{self.base_url}/api/show",
+                                    json={"model": self.model, "name": self.model}, timeout=5)
+            if response.status_code == 200:
+                return self._mark_verified()
+            
+            response = session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
-                models = [m['name'] for m in response.json().get('models', [])]
-                if any(self.model in m for m in models):
-                    print(f"✅ LLM ready: {self.model}")
-                    return True
+                names = {m['name'] for m in response.json().get('models', [])}
+                # "llama3" matches "llama3:latest" but not "llama3-uncensored"
+                if self.model in names or self.model in {n.split(':')[0] for n in names}:
+                    return self._mark_verified()
             print(f"⚠️ Model {self.model} not found. Please run: ollama pull {self.model}")
             return False
         except Exception as e:
             print(f"⚠️ Ollama not running. Please start it: ollama serve")
             return False
     
+    def _mark_verified(self) -> bool:
+        """Record that the model is available, for this and later agents."""
+        print(f"✅ LLM ready: {self.model}")
+        self._verified = True
+        _VERIFIED_MODELS.add((self.base_url, self.model))
+        return True
+    
     def generate_master_query(self, ddl: str, intents: List[str], database: str = "sqlite") -> str:
         """
         Generate a single comprehensive SQL query from DDL and intents.
@@ -37,30 +145,27 @@ class LLMAgent:
         # Parse table names from DDL for context
         tables = self._extract_table_names(ddl)
         
-        prompt = f"""You are a SQL expert. Generate a SINGLE comprehensive SQL query that joins ALL tables and returns ALL columns needed for data visualization.
-
-REQUIREMENTS:
-1. JOIN all tables based on foreign key relationships
-2. Use table aliases to avoid column name conflicts  
-3. Return ALL columns from ALL tables (use t1.*, t2.*, etc.)
-4. Do NOT aggregate - return raw data (D3.js will handle aggregations)
-5. Add LIMIT 10000 for performance
-6. Make sure the query is valid {database} SQL syntax
-
-DDL SCHEMA:
-{ddl}
-
-TABLES FOUND: {', '.join(tables)}
-
-USER WANTS TO ANALYZE: {', '.join(intents)}
-
-Return ONLY the SQL query, no explanation. The query should return flat, denormalized data that can be used for any visualization.
-
-SQL Query:"""
+        # Nothing to join: the fallback query is already the right answer.
+        # Schemas the regex may have misread still go to the LLM.
+        if _is_single_plain_table(ddl):
+            return self._generate_fallback_query(tables)
+        
+        cache_key = self._query_cache_key(ddl, intents, database)
+        cached = _QUERY_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = _MASTER_QUERY_TMPL.format_map({
+            'database': database,
+            'ddl': ddl,
+            'tables': ', '.join(tables),
+            'intents': ', '.join(intents),
+        })
 
         try:
-            response = requests.post(
+            response = _get_session().post(
                 f"{self.base_url}/api/generate",
+                timeout=_TIMEOUT,
                 json={
                     "model": self.model,
                     "prompt": prompt,
@@ -73,10 +178,13 @@ SQL Query:"""
             if response.status_code == 200:
                 sql = response.json().get('response', '').strip()
                 # Clean up the SQL
-                sql = sql.replace('```sql', '').replace('```', '').strip()
+                sql = _FENCE_RE.sub('', sql).strip()
                 
                 # Validate it looks like SQL
-                if 'SELECT' in sql.upper() and 'FROM' in sql.upper():
+                if _SQL_VALIDATE_RE.match(sql):
+                    if len(_QUERY_CACHE) >= _QUERY_CACHE_SIZE:
+                        _QUERY_CACHE.pop(next(iter(_QUERY_CACHE)))
+                    _QUERY_CACHE[cache_key] = sql
                     return sql
                 else:
                     return self._generate_fallback_query(tables)
@@ -88,15 +196,16 @@ SQL Query:"""
             print(f"⚠️ LLM error: {e}")
             return self._generate_fallback_query(tables)
     
+    def _query_cache_key(self, ddl: str, intents: List[str], database: str) -> bytes:
+        """Digest identifying a master-query request; the DDL goes first."""
+        return hashlib.blake2b(
+            "\0".join((ddl, self.base_url, self.model, database, *intents)).encode(),
+            digest_size=16
+        ).digest()
+    
     def _extract_table_names(self, ddl: str) -> List[str]:
         """Extract table names from DDL."""
-        import re
-        tables = []
-        pattern = r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([`"\']?)(\w+)\1'
-        matches = re.finditer(pattern, ddl, re.IGNORECASE)
-        for match in matches:
-            tables.append(match.group(2))
-        return tables
+        return extract_table_names(ddl)
     
     def _generate_fallback_query(self, tables: List[str]) -> str:
         """Generate a simple fallback query if LLM fails."""
@@ -2,14 +2,103 @@
 Combines DDL parsing, LLM query generation, and dashboard creation in one module.
 """
 
-import sqlglot
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 
 from schemas import GenerateRequest, GenerateResponse, DashboardConfig
-from llm import LLMAgent
+from llm import LLMAgent, extract_table_names
 from dashboard import generate_dashboard_html
 
+# Largest DDL accepted, in characters
+_MAX_DDL_CHARS = 100000
+
+# Execution scripts per database; only {query} is filled in per request.
+# The CSV/TSV to JSON converters use pandas' C parser and encoder when it
+# is installed and fall back to the csv module otherwise, encoding with
+# orjson when available.
+_SQLITE_SCRIPT_TMPL = """#!/bin/bash
+# SQLite execution
+sqlite3 your_database.db <<EOF
+.mode json
+.output data.json
+{query}
+EOF
+echo "✅ Query executed, results saved to data.json"
+"""
+
+_POSTGRES_SCRIPT_TMPL = """#!/bin/bash
+# PostgreSQL execution
+psql -h localhost -U your_user -d your_database -c "
+COPY (
+{query}
+) TO STDOUT WITH (FORMAT CSV, HEADER)
+" | python3 -c "
+import sys
+try:
+    import pandas
+except ImportError:
+    pandas = None
+if pandas is not None:
+    try:
+        records = pandas.read_csv(sys.stdin, dtype=str, keep_default_na=False).to_json(orient='records')
+    except pandas.errors.EmptyDataError:
+        records = '[]'
+    sys.stdout.write('{{\\"data\\": ' + records + '}}')
+else:
+    import csv
+    try:
+        import orjson
+        dumps = lambda obj: orjson.dumps(obj).decode()
+    except ImportError:
+        from json import dumps
+    print(dumps({{'data': list(csv.DictReader(sys.stdin))}}))
+" > data.json
+echo "✅ Query executed, results saved to data.json"
+"""
+
+_MYSQL_SCRIPT_TMPL = """#!/bin/bash
+# MySQL execution
+mysql -h localhost -u your_user -p your_database -e "{query}" --batch --raw | python3 -c "
+import sys
+try:
+    import pandas
+except ImportError:
+    pandas = None
+if pandas is not None:
+    # --batch prints nothing at all for an empty result
+    try:
+        records = pandas.read_csv(sys.stdin, sep='\\t', quoting=3, dtype=str,
+                                  keep_default_na=False).to_json(orient='records')
+    except pandas.errors.EmptyDataError:
+        records = '[]'
+    sys.stdout.write('{{\\"data\\": ' + records + '}}')
+else:
+    import csv
+    try:
+        import orjson
+        dumps = lambda obj: orjson.dumps(obj).decode()
+    except ImportError:
+        from json import dumps
+    rows = csv.DictReader(sys.stdin, delimiter='\\t', quoting=csv.QUOTE_NONE)
+    print(dumps({{'data': list(rows)}}))
+" > data.json
+echo "✅ Query executed, results saved to data.json"
+"""
+
+_GENERIC_SCRIPT_TMPL = """#!/bin/bash
+# Generic execution - adapt for your database
+# Execute: {query}
+# Save results as data.json
+echo "Please execute the query and save results as data.json"
+"""
+
+_EXECUTION_SCRIPT_TMPLS = {
+    "sqlite": _SQLITE_SCRIPT_TMPL,
+    "postgres": _POSTGRES_SCRIPT_TMPL,
+    "mysql": _MYSQL_SCRIPT_TMPL,
+}
+
 
 class SqlToDashboardServer:
     """Single unified server for the entire SQL to Dashboard workflow."""
@@ -32,32 +121,38 @@ class SqlToDashboardServer:
         """
         try:
             # Simple input validation
-            if len(request.ddl) > 100000:
-                raise ValueError(f"DDL too large: {len(request.ddl)} chars (max 100000)")
+            if len(request.ddl) > _MAX_DDL_CHARS:
+                raise ValueError(f"DDL too large: {len(request.ddl)} chars (max {_MAX_DDL_CHARS})")
             
             if not request.intents:
                 request.intents = ["General overview", "Key metrics", "Trends"]
             
             print(f"📋 Processing DDL with {len(request.intents)} intents...")
             
-            # 1. Parse DDL to validate syntax
-            tables = self._parse_ddl(request.ddl)
-            print(f"✅ Found {len(tables)} tables")
-            
-            # 2. Generate master query (ONE LLM call)
-            print("🤖 Generating master query...")
-            master_query = self.llm.generate_master_query(
-                ddl=request.ddl,
-                intents=request.intents,
-                database=request.database
-            )
-            
-            # 3. Generate dashboard HTML
-            print("📊 Creating dashboard template...")
-            dashboard_html = generate_dashboard_html(
-                title=f"Dashboard: {', '.join(request.intents[:2])}",
-                theme="light"
-            )
+            # The LLM call dominates and mostly waits on the network, so
+            # steps 1 and 3 run while it is in flight
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                # 2. Generate master query (ONE LLM call)
+                print("🤖 Generating master query...")
+                query_future = pool.submit(
+                    self.llm.generate_master_query,
+                    ddl=request.ddl,
+                    intents=request.intents,
+                    database=request.database
+                )
+                
+                # 1. Find the tables defined in the DDL
+                tables = self._parse_ddl(request.ddl)
+                print(f"✅ Found {len(tables)} tables")
+                
+                # 3. Generate dashboard HTML
+                print("📊 Creating dashboard template...")
+                dashboard_html = generate_dashboard_html(
+                    title=f"Dashboard: {', '.join(request.intents[:2])}",
+                    theme="light"
+                )
+                
+                master_query = query_future.result()
             
             # 4. Create execution script
             execution_script = self._create_execution_script(
@@ -102,95 +197,14 @@ The dashboard will automatically load data.json and create visualizations!
             )
     
     def _parse_ddl(self, ddl: str) -> List[str]:
-        """Parse DDL and extract table names for validation."""
-        tables = []
-        try:
-            # Use sqlglot for parsing
-            statements = sqlglot.parse(ddl)
-            for statement in statements:
-                # Check if it's a CREATE TABLE statement
-                if statement and hasattr(statement, 'kind') and statement.kind == 'TABLE':
-                    # Extract table name
-                    if hasattr(statement, 'this') and hasattr(statement.this, 'name'):
-                        tables.append(statement.this.name)
-                elif statement and str(statement).upper().startswith('CREATE TABLE'):
-                    # Alternative extraction for different sqlglot versions
-                    try:
-                        # Try to find table name in the SQL text
-                        sql_text = str(statement)
-                        import re
-                        match = re.search(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([`"\']?)(\w+)\1', sql_text, re.IGNORECASE)
-                        if match:
-                            tables.append(match.group(2))
-                    except:
-                        pass
-        except Exception as e:
-            print(f"⚠️ DDL parsing warning: {e}")
-            # Fallback to regex - this is actually quite reliable
-            pass
-        
-        # Always use regex as backup/primary method since it's reliable
-        if not tables:
-            import re
-            pattern = r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([`"\']?)(\w+)\1'
-            matches = re.finditer(pattern, ddl, re.IGNORECASE)
-            for match in matches:
-                table_name = match.group(2)
-                if table_name not in tables:
-                    tables.append(table_name)
-        
-        return tables
+        """Extract table names from DDL for validation, in order of first appearance."""
+        # Only the names are used, so the LLM agent's regex pass replaces a full SQL parse
+        return extract_table_names(ddl)
     
     def _create_execution_script(self, query: str, database: str) -> str:
         """Create a shell script to execute the query."""
-        if database == "sqlite":
-            return f"""#!/bin/bash
-# SQLite execution
-sqlite3 your_database.db <<EOF
-.mode json
-.output data.json
-{query}
-EOF
-echo "✅ Query executed, results saved to data.json"
-"""
-        elif database == "postgres":
-            return f"""#!/bin/bash
-# PostgreSQL execution
-psql -h localhost -U your_user -d your_database -c "
-COPY (
-{query}
-) TO STDOUT WITH (FORMAT CSV, HEADER)
-" | python3 -c "
-import sys, csv, json
-reader = csv.DictReader(sys.stdin)
-data = list(reader)
-print(json.dumps({{'data': data}}, indent=2))
-" > data.json
-echo "✅ Query executed, results saved to data.json"
-"""
-        elif database == "mysql":
-            return f"""#!/bin/bash
-# MySQL execution
-mysql -h localhost -u your_user -p your_database -e "{query}" --batch --raw | python3 -c "
-import sys, json
-lines = sys.stdin.readlines()
-if len(lines) > 1:
-    headers = lines[0].strip().split('\\t')
-    data = []
-    for line in lines[1:]:
-        values = line.strip().split('\\t')
-        data.append(dict(zip(headers, values)))
-    print(json.dumps({{'data': data}}, indent=2))
-" > data.json
-echo "✅ Query executed, results saved to data.json"
-"""
-        else:
-            return f"""#!/bin/bash
-# Generic execution - adapt for your database
-# Execute: {query}
-# Save results as data.json
-echo "Please execute the query and save results as data.json"
-"""
+        template = _EXECUTION_SCRIPT_TMPLS.get(database, _GENERIC_SCRIPT_TMPL)
+        return template.format_map({'query': query})
     
     def _get_execution_command(self, database: str) -> str:
         """Get the appropriate execution command for the database."""
@@ -202,20 +216,37 @@ echo "Please execute the query and save results as data.json"
         return commands.get(database, "Execute query.sql and save as data.json")
 
 
+def read_ddl_file(ddl_file: str) -> str:
+    """
+    Read a DDL file, refusing files over the DDL size limit.
+    
+    At most one character past the limit is read, so an oversized file is
+    rejected without loading it into memory.
+    """
+    with open(ddl_file, 'r') as f:
+        ddl = f.read(_MAX_DDL_CHARS + 1)
+    if len(ddl) > _MAX_DDL_CHARS:
+        raise ValueError(f"DDL too large: {ddl_file} exceeds {_MAX_DDL_CHARS} chars")
+    return ddl
+
+
 # Standalone function for easy testing
-def generate_from_file(ddl_file: str, intents: List[str], output_dir: str = "./output"):
+def generate_from_file(ddl_file: str, intents: List[str], output_dir: str = "./output",
+                       server: Optional[SqlToDashboardServer] = None):
     """
     Convenience function to generate everything from a DDL file.
     
+    Pass an existing server to reuse it; otherwise a new one is created.
+    
     Usage:
         generate_from_file("schema.sql", ["sales analytics", "customer insights"])
     """
     # Read DDL
-    with open(ddl_file, 'r') as f:
-        ddl = f.read()
+    ddl = read_ddl_file(ddl_file)
     
-    # Create server and generate
-    server = SqlToDashboardServer()
+    # Create server (unless given one) and generate
+    if server is None:
+        server = SqlToDashboardServer()
     request = GenerateRequest(ddl=ddl, intents=intents)
     response = server.generate_all(request)
     
@@ -223,14 +254,9 @@ def generate_from_file(ddl_file: str, intents: List[str], output_dir: str = "./o
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
     
-    with open(output_path / "query.sql", 'w') as f:
-        f.write(response.query)
-    
-    with open(output_path / "dashboard.html", 'w') as f:
-        f.write(response.dashboard_html)
-    
-    with open(output_path / "execute.sh", 'w') as f:
-        f.write(response.execution_script)
+    (output_path / "query.sql").write_text(response.query)
+    (output_path / "dashboard.html").write_text(response.dashboard_html)
+    (output_path / "execute.sh").write_text(response.execution_script)
     
     print(f"\n📁 Files saved to: {output_path}")
     print(response.instructions)
@@ -8,29 +8,50 @@ from pathlib import Path
 from schemas import GenerateRequest, GenerateResponse
 from server import SqlToDashboardServer
 
+# Schemas shared by all tests
+_USERS_ORDERS_DDL = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100),
+    email VARCHAR(255)
+);
+
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    total DECIMAL(10,2),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+"""
+
+_PRODUCTS_DDL = """
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY,
+    name VARCHAR(100),
+    price DECIMAL(10,2),
+    category VARCHAR(50)
+);
+"""
+
+# One server (and LLM agent) shared by all tests
+_SERVER = None
+
+
+def _get_server() -> SqlToDashboardServer:
+    """Return the shared test server, creating it on first use."""
+    global _SERVER
+    if _SERVER is None:
+        _SERVER = SqlToDashboardServer()
+    return _SERVER
+
 
 def test_basic_generation():
     """Test basic DDL to dashboard generation."""
     print("🧪 Test 1: Basic Generation")
     
-    ddl = """
-    CREATE TABLE users (
-        id INTEGER PRIMARY KEY,
-        name VARCHAR(100),
-        email VARCHAR(255)
-    );
-    
-    CREATE TABLE orders (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        total DECIMAL(10,2),
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    );
-    """
-    
-    server = SqlToDashboardServer()
+    server = _get_server()
     request = GenerateRequest(
-        ddl=ddl,
+        ddl=_USERS_ORDERS_DDL,
         intents=["User orders", "Revenue analysis"],
         database="sqlite"
     )
@@ -60,21 +81,14 @@ def test_file_generation():
     test_dir.mkdir(exist_ok=True)
     
     ddl_file = test_dir / "test_schema.sql"
-    with open(ddl_file, 'w') as f:
-        f.write("""
-        CREATE TABLE products (
-            id INTEGER PRIMARY KEY,
-            name VARCHAR(100),
-            price DECIMAL(10,2),
-            category VARCHAR(50)
-        );
-        """)
+    ddl_file.write_text(_PRODUCTS_DDL)
     
     # Generate files
     response = generate_from_file(
         str(ddl_file),
         ["Product analysis", "Price trends"],
-        str(test_dir)
+        str(test_dir),
+        server=_get_server()
     )
     
     # Verify files created
@@ -94,7 +108,7 @@ def test_error_handling():
     """Test error handling with invalid input."""
     print("🧪 Test 3: Error Handling")
     
-    server = SqlToDashboardServer()
+    server = _get_server()
     
     # Test with invalid DDL
     request = GenerateRequest(
@@ -114,6 +128,42 @@ def test_error_handling():
     return True
 
 
+def test_single_table_detection():
+    """Test which schemas skip the LLM as a plain single table."""
+    print("🧪 Test 4: Single Table Detection")
+    
+    from llm import _is_single_plain_table
+    
+    assert _is_single_plain_table(_PRODUCTS_DDL)
+    assert not _is_single_plain_table(_USERS_ORDERS_DDL)
+    assert not _is_single_plain_table("CREATE TABLE public.users (id INTEGER);")
+    assert not _is_single_plain_table("CREATE TABLE [dbo].[Users] (id INT); CREATE TABLE [dbo].[Orders] (id INT);")
+    assert not _is_single_plain_table("CREATE TEMP TABLE staging (id INTEGER);")
+    
+    print("  ✅ Only plainly named single tables skip the LLM")
+    return True
+
+
+def test_empty_result_conversion():
+    """Test that execution scripts write an empty data list for empty results."""
+    print("🧪 Test 5: Empty Result Conversion")
+    
+    import subprocess
+    import sys
+    
+    server = _get_server()
+    for database in ("postgres", "mysql"):
+        script = server._create_execution_script("SELECT 1", database)
+        # The result converter is the python3 -c "..." program inside the script
+        converter = script.split('python3 -c "', 1)[1].split('\n" > data.json', 1)[0].replace('\\"', '"')
+        output = subprocess.run([sys.executable, "-c", converter], input="",
+                                capture_output=True, text=True, check=True).stdout
+        assert json.loads(output) == {"data": []}, f"{database}: {output!r}"
+    
+    print("  ✅ Empty results convert to {\"data\": []}")
+    return True
+
+
 def run_all_tests():
     """Run all tests."""
     print("=" * 50)
@@ -123,7 +173,9 @@ def run_all_tests():
     tests = [
         test_basic_generation,
         test_file_generation,
-        test_error_handling
+        test_error_handling,
+        test_single_table_detection,
+        test_empty_result_conversion
     ]
     
     passed = 0
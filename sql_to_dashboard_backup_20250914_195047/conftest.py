@@ -0,0 +1,28 @@
+"""Pytest configuration for the script-style test modules."""
+
+import pytest
+
+from test_llm_integration import _probe_ollama
+
+# Tests that only make sense against a running Ollama server; the rest
+# either run offline or fall back to rule-based behaviour
+_OLLAMA_TESTS = {
+    "test_ollama_connection",
+    "test_llm_connector",
+    "test_natural_language_query",
+}
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the Ollama-backed tests when no server answers."""
+    if not any(item.name in _OLLAMA_TESTS for item in items):
+        return
+    
+    models, error = _probe_ollama()
+    if models is not None:
+        return
+    
+    skip = pytest.mark.skip(reason=error)
+    for item in items:
+        if item.name in _OLLAMA_TESTS:
+            item.add_marker(skip)
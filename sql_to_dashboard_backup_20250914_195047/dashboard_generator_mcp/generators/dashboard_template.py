@@ -252,7 +252,7 @@ class DashboardTemplate:
         """Generate JavaScript code for a specific chart."""
         
         # Convert data to JSON string for embedding
-        data_json = json.dumps(data, indent=2)
+        data_json = json.dumps(data, separators=(',', ':'))
         
         if config.type.value == "bar":
             return DashboardTemplate._generate_bar_chart_js(chart_id, config, data_json)
@@ -2,21 +2,15 @@
 
 import json
 from typing import Optional, Dict, Any, List
-import sys
-from pathlib import Path
-import os
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
-
-from ddl_parser_mcp.schema import (
+from .schema import (
     DDLParserRequest, 
     DDLParserResponse, 
     InputFormat,
     QuerySuggestion
 )
-from ddl_parser_mcp.parser.ddl_parser import DDLParser
-from ddl_parser_mcp.generator.sql_generator import SQLGenerator
+from .parser.ddl_parser import DDLParser
+from .generator.sql_generator import SQLGenerator
 from shared.validators import validate_input_size, validate_ddl_safety
 from shared.errors import MCPError, ParsingError, ValidationError
 
@@ -48,11 +42,10 @@ class EnhancedDDLParserMCPServer:
         
         if self.use_llm:
             try:
-                # Check if Ollama is running
-                import requests
-                response = requests.get("http://localhost:11434/api/tags", timeout=2)
-                if response.status_code == 200:
-                    self.llm_agent = SQLIntelligenceAgent(llm_model=llm_model)
+                # Check if Ollama is running; the agent keeps the probe's pooled connection
+                agent = SQLIntelligenceAgent(llm_model=llm_model)
+                if agent.llm.is_available():
+                    self.llm_agent = agent
                     print(f"✨ LLM agent initialized with model: {llm_model}")
                 else:
                     print("⚠️ Ollama is not responding. Running without LLM.")
@@ -179,7 +172,8 @@ class EnhancedDDLParserMCPServer:
         # Create instructions
         instructions = self._create_user_instructions(schema, suggestions, metadata)
         
-        return DDLParserResponse(
+        # Nested models were validated when built; skip a second validation pass
+        return DDLParserResponse.model_construct(
             status="success",
             schema=schema,
             suggested_queries=suggestions,
@@ -191,7 +185,7 @@ class EnhancedDDLParserMCPServer:
     def _handle_mermaid_input(self, request: DDLParserRequest) -> DDLParserResponse:
         """Handle Mermaid ER diagram input."""
         # For now, return a placeholder
-        return DDLParserResponse(
+        return DDLParserResponse.model_construct(
             status="success",
             instructions="""
 Mermaid ER diagram parsing is coming soon!
@@ -408,7 +402,7 @@ Run queries with your preferred database tool and save the results!
         }
 
 
-# Example usage
+# Example usage (run from the project root: python -m ddl_parser_mcp.enhanced_server)
 if __name__ == "__main__":
     # Try with LLM if available
     server = EnhancedDDLParserMCPServer(use_llm=True)
@@ -0,0 +1,5 @@
+"""SQL query generation from parsed schemas."""
+
+from .sql_generator import SQLGenerator
+
+__all__ = ['SQLGenerator']
@@ -1,13 +1,8 @@
 """SQL query generator from database schema."""
 
 from typing import List, Optional, Dict, Any
-import sys
-from pathlib import Path
 
-# Add parent directories to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
-
-from ddl_parser_mcp.schema import DatabaseSchema, TableInfo, QuerySuggestion, Relationship
+from ..schema import DatabaseSchema, TableInfo, QuerySuggestion, Relationship
 
 
 class SQLGenerator:
@@ -0,0 +1,5 @@
+"""DDL parsing into structured schema models."""
+
+from .ddl_parser import DDLParser
+
+__all__ = ['DDLParser']
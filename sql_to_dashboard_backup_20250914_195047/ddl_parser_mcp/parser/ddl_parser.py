@@ -3,13 +3,8 @@
 import sqlglot
 from sqlglot import parse_one, exp
 from typing import List, Dict, Any, Optional
-import sys
-from pathlib import Path
 
-# Add parent directories to path
-sys.path.append(str(Path(__file__).parent.parent.parent))
-
-from ddl_parser_mcp.schema import TableInfo, ColumnInfo, Relationship, DatabaseSchema, RelationType
+from ..schema import TableInfo, ColumnInfo, Relationship, DatabaseSchema, RelationType
 from shared.errors import ParsingError
 
 
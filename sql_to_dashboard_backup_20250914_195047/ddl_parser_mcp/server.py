@@ -2,20 +2,15 @@
 
 import json
 from typing import Optional
-import sys
-from pathlib import Path
 
-# Add parent directory to path
-sys.path.append(str(Path(__file__).parent.parent))
-
-from ddl_parser_mcp.schema import (
+from .schema import (
     DDLParserRequest, 
     DDLParserResponse, 
     InputFormat,
     QuerySuggestion
 )
-from ddl_parser_mcp.parser.ddl_parser import DDLParser
-from ddl_parser_mcp.generator.sql_generator import SQLGenerator
+from .parser.ddl_parser import DDLParser
+from .generator.sql_generator import SQLGenerator
 from shared.validators import validate_input_size, validate_ddl_safety
 from shared.errors import MCPError, ParsingError, ValidationError
 
@@ -95,7 +90,8 @@ class DDLParserMCPServer:
         # Create instructions for the user
         instructions = self._create_user_instructions(schema, suggestions)
         
-        return DDLParserResponse(
+        # Nested models were validated when built; skip a second validation pass
+        return DDLParserResponse.model_construct(
             status="success",
             schema=schema,
             suggested_queries=suggestions,
@@ -111,7 +107,7 @@ class DDLParserMCPServer:
     def _handle_mermaid_input(self, request: DDLParserRequest) -> DDLParserResponse:
         """Handle Mermaid ER diagram input."""
         # For now, return a placeholder - full Mermaid parsing to be implemented
-        return DDLParserResponse(
+        return DDLParserResponse.model_construct(
             status="success",
             instructions="""
 Mermaid ER diagram parsing is coming soon!
@@ -223,7 +219,7 @@ Run queries with your preferred database tool and save the results!
             return error_response.model_dump_json(indent=2)
 
 
-# Example usage
+# Example usage (run from the project root: python -m ddl_parser_mcp.server)
 if __name__ == "__main__":
     server = DDLParserMCPServer()
     
@@ -1,9 +1,24 @@
 """LLM integration module for SQL-to-Dashboard system."""
 
-from .ollama_connector import OllamaConnector
-from .sql_intelligence import SQLIntelligenceAgent
+import importlib
+
+# Submodules are imported on first attribute access (PEP 562), so using
+# OllamaConnector does not also load the SQL intelligence agent.
+_LAZY = {
+    "OllamaConnector": ".ollama_connector",
+    "SQLIntelligenceAgent": ".sql_intelligence",
+}
 
 __all__ = [
     "OllamaConnector",
     "SQLIntelligenceAgent"
 ]
+
+
+def __getattr__(name):
+    """Import an exported name from its submodule on first access."""
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,15 @@
+"""Query intent types shared by the LLM agents."""
+
+from enum import Enum
+
+
+class QueryIntent(Enum):
+    """Types of SQL query intents."""
+    OVERVIEW = "overview"
+    AGGREGATION = "aggregation"
+    DISTRIBUTION = "distribution"
+    RELATIONSHIP = "relationship"
+    TIME_SERIES = "time_series"
+    COMPARISON = "comparison"
+    RANKING = "ranking"
+    DETAIL = "detail"
@@ -1,40 +1,315 @@
 """Ollama LLM connector for SQL and Dashboard intelligence."""
 
+import hashlib
 import json
+import os
 import re
-import requests
-from typing import Dict, Any, Optional, List
-from enum import Enum
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 
+try:
+    import orjson
+except ImportError:  # Optional speedup; stdlib json is used otherwise
+    orjson = None
 
-class QueryIntent(Enum):
-    """Types of SQL query intents."""
-    OVERVIEW = "overview"
-    AGGREGATION = "aggregation"
-    DISTRIBUTION = "distribution"
-    RELATIONSHIP = "relationship"
-    TIME_SERIES = "time_series"
-    COMPARISON = "comparison"
-    RANKING = "ranking"
-    DETAIL = "detail"
+# Shared keep-alive session, created on first use so importing this module
+# does not pull in requests/urllib3
+_SESSION = None
+
+# Exact-match response cache shared by all connectors, keyed on a prompt digest
+_EXACT_CACHE: Dict[bytes, str] = {}
+_EXACT_CACHE_SIZE = 1024
+_EXACT_CACHE_LOCK = threading.Lock()  # generate_batch stores from worker threads
+
+# Semantic cache settings (opt-in, see OllamaConnector.__init__)
+_EMBED_MODEL = "nomic-embed-text"
+_SEMANTIC_CACHE_SIZE = 1024
+_SEMANTIC_THRESHOLD = 0.95
+
+# Column descriptors for visualization prompts read this many rows, stop
+# counting distinct values at the cap and shorten long example values
+_DESCRIBE_ROWS = 50
+_DISTINCT_CAP = 32
+_EXAMPLE_CHARS = 100
+
+# Ollama structured-output schemas (format=<schema>, Ollama 0.5+) for SQL
+# generation, so the sampler can only emit objects of this shape
+_SQL_QUERY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "query": {"type": "string"},
+        "description": {"type": "string"},
+        "explanation": {"type": "string"},
+        "intent_type": {"type": "string"},
+        "tables_used": {"type": "array", "items": {"type": "string"}},
+        "visualization_hint": {"type": "string"},
+        "expected_columns": {"type": "array", "items": {"type": "string"}},
+        "has_aggregation": {"type": "boolean"},
+        "has_time_component": {"type": "boolean"}
+    },
+    "required": ["query", "description", "explanation", "intent_type", "visualization_hint"]
+}
+_SQL_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": _SQL_QUERY_SCHEMA}},
+    "required": ["results"]
+}
+
+_FENCE_RE = re.compile(r'```(?:sql)?\s*', re.IGNORECASE)
+_SQL_EXTRACT_RE = re.compile(r'(SELECT.*?;)', re.IGNORECASE | re.DOTALL)
+
+
+# (connect, read) timeouts for Ollama requests
+_TIMEOUT = (3.05, 120)
+
+# Generations in flight per Ollama server, shared by all connectors. Match
+# the server's OLLAMA_NUM_PARALLEL so extra requests wait here instead of
+# queueing inside Ollama behind a read timeout.
+_PARALLEL_SLOTS = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL") or 4))
+_SLOTS: Dict[str, threading.BoundedSemaphore] = {}
+_SLOTS_LOCK = threading.Lock()
+
+# After this many consecutive failed generations a server is not contacted
+# again until the cool-down has passed, so callers fall back immediately
+# instead of each waiting out its own timeout
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 30.0
+_BREAKERS: Dict[str, "_CircuitBreaker"] = {}
+
+# Servers that rejected a JSON-schema format (Ollama before 0.5); requests
+# to them use plain JSON mode instead
+_SCHEMA_FORMAT_UNSUPPORTED = set()
+
+
+def _get_session():
+    """Return the shared pooled session, creating it on first call."""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        session = requests.Session()
+        # Retry transient 5xx while a model warms up; fail fast if Ollama is down.
+        # Never resend after a read timeout: the generation may still be running.
+        retry = Retry(total=3, connect=1, read=0, backoff_factor=0.3,
+                      status_forcelist=[502, 503, 504], allowed_methods=['GET', 'POST'])
+        session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        session.headers.update({'Connection': 'keep-alive'})
+        _SESSION = session
+    return _SESSION
+
+
+def _server_slots(base_url: str) -> threading.BoundedSemaphore:
+    """Return the semaphore limiting concurrent generations against base_url."""
+    with _SLOTS_LOCK:
+        slots = _SLOTS.get(base_url)
+        if slots is None:
+            slots = _SLOTS[base_url] = threading.BoundedSemaphore(_PARALLEL_SLOTS)
+        return slots
+
+
+def _server_breaker(base_url: str) -> "_CircuitBreaker":
+    """Return the circuit breaker guarding generations against base_url."""
+    with _SLOTS_LOCK:
+        breaker = _BREAKERS.get(base_url)
+        if breaker is None:
+            breaker = _BREAKERS[base_url] = _CircuitBreaker()
+        return breaker
+
+
+def _cache_store(cache_key: bytes, response_text: str) -> None:
+    """Add a response to the exact-match cache, evicting the oldest entry when full."""
+    with _EXACT_CACHE_LOCK:
+        if len(_EXACT_CACHE) >= _EXACT_CACHE_SIZE:
+            _EXACT_CACHE.pop(next(iter(_EXACT_CACHE)))
+        _EXACT_CACHE[cache_key] = response_text
+
+
+def _json_loads(data):
+    """Decode JSON from str or bytes, preferring orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Encode obj as JSON text for a prompt, preferring orjson when installed.
+    
+    Values JSON has no type for (Decimal, date, ...) are written with str(),
+    so query result rows can be summarized as they come from the database.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option, default=str).decode()
+    return json.dumps(obj, indent=2 if indent else None, default=str)
+
+
+def _extract_first_json(text: str, start: int = 0) -> Optional[str]:
+    """
+    Return the first balanced {...} region in text at or after start, or None.
+    
+    Braces inside JSON string literals are ignored, so trailing prose or a
+    second object after the first one does not end up in the result.
+    """
+    start = text.find("{", start)
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _parse_first_json(text: str) -> Optional[Any]:
+    """
+    Decode the first balanced {...} region in text that is valid JSON, or None.
+    
+    A brace-delimited region that is not JSON (e.g. a "{placeholder}" in
+    prose before the real object) is skipped and the scan resumes after it.
+    An object that is still open yields None rather than an object nested
+    inside it.
+    """
+    # Schema-constrained responses are exactly one object; decode them whole
+    if text[:1] == "{":
+        try:
+            return _json_loads(text)
+        except ValueError:
+            pass
+    start = text.find("{")
+    while start != -1:
+        json_text = _extract_first_json(text, start)
+        if json_text is None:
+            # Unbalanced: every later "{" is nested inside this open object
+            return None
+        try:
+            return _json_loads(json_text)
+        except ValueError:
+            pass
+        start = text.find("{", start + len(json_text))
+    return None
+
+
+class _OllamaStreamError(Exception):
+    """An error reported inside an Ollama response stream."""
+
+
+class _CircuitOpenError(Exception):
+    """Raised instead of contacting a server whose circuit breaker is open."""
+
+
+class _CircuitBreaker:
+    """Counts consecutive request failures against one server."""
+    
+    def __init__(self, threshold: int = _BREAKER_THRESHOLD, cooldown: float = _BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False  # Half-open: the one probe request is in flight
+        self._lock = threading.Lock()
+    
+    def check(self) -> None:
+        """Raise _CircuitOpenError unless the caller may contact the server."""
+        if self._failures < self.threshold:
+            return
+        with self._lock:
+            if self._failures < self.threshold:
+                return
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                raise _CircuitOpenError(f"retrying in {remaining:.0f}s")
+            if self._probing:
+                raise _CircuitOpenError("waiting for the probe request")
+            self._probing = True
+    
+    def record_success(self) -> None:
+        """Close the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+            self._probing = False
+    
+    def record_failure(self) -> None:
+        """
+        Count a failure and open the breaker once the threshold is reached.
+        
+        After the cool-down a single request is let through as a probe. Its
+        failure reopens the breaker at once, its success closes it.
+        """
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
+
+
+def _request_error_message(error: Exception) -> str:
+    """Map an exception raised while talking to Ollama to an error string."""
+    import requests  # Already loaded by _get_session(); needed for exception types
+    
+    if isinstance(error, _OllamaStreamError):
+        return f"LLM Error: {error}"
+    if isinstance(error, _CircuitOpenError):
+        return f"Error: Ollama is failing repeatedly, {error}"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Error: Request to LLM timed out"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "Error: Cannot connect to Ollama. Make sure it's running with 'ollama run llama3'"
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Error: Ollama request failed - {str(error)}"
+    if isinstance(error, json.JSONDecodeError):
+        return "Error: Invalid JSON response from Ollama"
+    return f"Error: Unexpected error - {str(error)}"
 
 
 class OllamaConnector:
     """Connector for Ollama local LLM with SQL/Dashboard focus."""
     
-    def __init__(self, model: str = "llama3", base_url: str = "http://localhost:11434"):
+    def __init__(self, model: str = "llama3", base_url: str = "http://localhost:11434",
+                 enable_semantic_cache: bool = False):
         """
         Initialize Ollama connector.
         
         Args:
             model: Ollama model to use (llama3, codellama, mistral, etc.)
             base_url: Ollama API base URL
+            enable_semantic_cache: Reuse responses for near-identical requests
+                that pass semantic_text to generate() (requires the
+                nomic-embed-text model and numpy)
         """
         self.model = model
         self.base_url = base_url
         self.api_url = f"{base_url}/api/generate"
+        self.enable_semantic_cache = enable_semantic_cache
+        self._semantic_cache: List[tuple] = []  # (context digest, unit embedding, response)
     
-    def generate(self, prompt: str, system: Optional[str] = None, temperature: float = 0.3) -> str:
+    def generate(self, prompt: str, system: Optional[str] = None, temperature: float = 0.3,
+                 stop_at_json: bool = False, max_tokens: int = 512, json_mode: bool = False,
+                 json_schema: Optional[Dict[str, Any]] = None,
+                 semantic_text: Optional[str] = None) -> str:
         """
         Generate text using Ollama.
         
@@ -42,6 +317,14 @@ class OllamaConnector:
             prompt: User prompt
             system: System message for context
             temperature: Generation temperature (0.0-1.0)
+            stop_at_json: Stop streaming once the first JSON object is complete
+            max_tokens: Upper bound on generated tokens (num_predict)
+            json_mode: Constrain decoding to valid JSON (Ollama format="json")
+            json_schema: Constrain decoding to JSON matching this schema instead
+            semantic_text: The request-specific part of prompt (e.g. the user
+                intent). With the semantic cache enabled, only this text is
+                embedded; the rest of the prompt and every other setting must
+                match exactly for a cached response to be reused.
             
         Returns:
             Generated text response
@@ -49,13 +332,129 @@ class OllamaConnector:
         if not prompt or not prompt.strip():
             return "Error: Empty prompt provided"
         
+        temperature = max(0.0, min(1.0, temperature))
+        output_format = json_schema or ("json" if json_mode else None)
+        cache_key = self._cache_key(prompt, system, temperature, max_tokens, output_format,
+                                    stop_at_json)
+        cached = _EXACT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        embedding = semantic_context = None
+        if self.enable_semantic_cache and semantic_text:
+            # Shared template and schema text would dominate a whole-prompt
+            # embedding, so it is matched exactly and only the rest embedded
+            semantic_context = self._cache_key(prompt.replace(semantic_text, "", 1), system,
+                                               temperature, max_tokens, output_format, stop_at_json)
+            embedding = self._embed(semantic_text)
+            cached = self._semantic_lookup(semantic_context, embedding)
+            if cached is not None:
+                return cached
+        
+        response_text = self._call_ollama(prompt, system, temperature, stop_at_json,
+                                          max_tokens, output_format)
+        # A reply that should be JSON but does not decode (truncated, or prose
+        # only) is a failed generation; leave it uncached so it is retried
+        expects_json = stop_at_json or output_format is not None
+        if not response_text.startswith(("Error:", "LLM Error:")) and \
+                not (expects_json and _parse_first_json(response_text) is None):
+            _cache_store(cache_key, response_text)
+            if embedding is not None:
+                self._semantic_store(semantic_context, embedding, response_text)
+        
+        return response_text
+    
+    def generate_stream(self, prompt: str, system: Optional[str] = None, temperature: float = 0.3,
+                        max_tokens: int = 512) -> Iterator[str]:
+        """
+        Generate text using Ollama, yielding response pieces as they arrive.
+        
+        Args:
+            prompt: User prompt
+            system: System message for context
+            temperature: Generation temperature (0.0-1.0)
+            max_tokens: Upper bound on generated tokens (num_predict)
+            
+        Yields:
+            Response text pieces. A failure ends the stream with one "Error: ..."
+            (or "LLM Error: ...") piece, also after partial output, as in
+            _call_ollama.
+        """
+        if not prompt or not prompt.strip():
+            yield "Error: Empty prompt provided"
+            return
+        
+        temperature = max(0.0, min(1.0, temperature))
+        cache_key = self._cache_key(prompt, system, temperature, max_tokens, None)
+        cached = _EXACT_CACHE.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        pieces = []
+        try:
+            for piece in self._stream_pieces(prompt, system, temperature, max_tokens, None):
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            yield _request_error_message(e)
+            return
+        
+        response_text = "".join(pieces).strip()
+        if response_text:
+            _cache_store(cache_key, response_text)
+        else:
+            yield "Error: Empty response from LLM"
+    
+    def _cache_key(self, prompt: str, system: Optional[str], temperature: float,
+                   max_tokens: int, output_format: Optional[Any], stop_at_json: bool = False) -> bytes:
+        """
+        Digest identifying a generation request in the exact-match cache.
+        
+        The server URL and stop_at_json are part of the key, so a reply cut
+        short at its first JSON object is never served to a full call and
+        servers running the same model keep separate entries.
+        """
+        return hashlib.blake2b(
+            f"{self.base_url}|{self.model}|{system}|{temperature:.2f}|{max_tokens}|"
+            f"{output_format}|{stop_at_json}|{prompt}".encode(),
+            digest_size=16
+        ).digest()
+    
+    def _call_ollama(self, prompt: str, system: Optional[str], temperature: float,
+                     stop_at_json: bool = False, max_tokens: int = 512,
+                     output_format: Optional[Any] = None) -> str:
+        """Stream a single uncached generation from Ollama and join the chunks."""
+        pieces = []
+        stream = self._stream_pieces(prompt, system, temperature, max_tokens, output_format)
+        try:
+            for piece in stream:
+                pieces.append(piece)
+                # Closing the stream early aborts the rest of the generation. Only
+                # stop once an object decodes; a "{placeholder}" in prose does not.
+                if stop_at_json and "}" in piece and _parse_first_json("".join(pieces)) is not None:
+                    break
+        except Exception as e:
+            return _request_error_message(e)
+        finally:
+            stream.close()
+        
+        response_text = "".join(pieces).strip()
+        if not response_text:
+            return "Error: Empty response from LLM"
+        
+        return response_text
+    
+    def _stream_pieces(self, prompt: str, system: Optional[str], temperature: float,
+                       max_tokens: int, output_format: Optional[Any]) -> Iterator[str]:
+        """Yield response pieces from a streaming Ollama request; raises on failure."""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
-            "temperature": max(0.0, min(1.0, temperature)),
+            "stream": True,
             "options": {
-                "num_predict": 2048,  # Increase for longer SQL queries
+                "temperature": temperature,
+                "num_predict": max_tokens,
                 "top_p": 0.9,
                 "top_k": 40
             }
@@ -63,44 +462,118 @@ class OllamaConnector:
         
         if system:
             payload["system"] = system
+        if isinstance(output_format, dict) and self.base_url in _SCHEMA_FORMAT_UNSUPPORTED:
+            output_format = "json"
+        if output_format:
+            payload["format"] = output_format
         
+        breaker = _server_breaker(self.base_url)
+        breaker.check()
         try:
-            response = requests.post(self.api_url, json=payload, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            
-            if "error" in result:
-                return f"LLM Error: {result['error']}"
-            
-            response_text = result.get("response", "").strip()
-            if not response_text:
-                return "Error: Empty response from LLM"
-            
-            return response_text
-            
-        except requests.exceptions.Timeout:
-            return "Error: Request to LLM timed out"
-        except requests.exceptions.ConnectionError:
-            return "Error: Cannot connect to Ollama. Make sure it's running with 'ollama run llama3'"
-        except requests.exceptions.RequestException as e:
-            return f"Error: Ollama request failed - {str(e)}"
-        except json.JSONDecodeError:
-            return "Error: Invalid JSON response from Ollama"
+            with _server_slots(self.base_url):
+                response = _get_session().post(self.api_url, json=payload, timeout=_TIMEOUT, stream=True)
+                if response.status_code == 400 and isinstance(output_format, dict):
+                    # Ollama before 0.5 rejects schema formats; retry once in JSON mode
+                    response.close()
+                    payload["format"] = "json"
+                    response = _get_session().post(self.api_url, json=payload, timeout=_TIMEOUT, stream=True)
+                    if response.status_code < 400:
+                        _SCHEMA_FORMAT_UNSUPPORTED.add(self.base_url)
+                with response:
+                    if response.status_code < 500:
+                        # The server is up; a 4xx only rejects this request
+                        breaker.record_success()
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = _json_loads(line)
+                        
+                        if "error" in chunk:
+                            raise _OllamaStreamError(chunk["error"])
+                        
+                        yield chunk.get("response", "")
+                        if chunk.get("done"):
+                            return
+        except _OllamaStreamError:
+            raise
         except Exception as e:
-            return f"Error: Unexpected error - {str(e)}"
+            # Connection failures, 5xx responses and stalled streams
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is None or status >= 500:
+                breaker.record_failure()
+            raise
     
-    def analyze_schema(self, schema_info: Dict[str, Any]) -> Dict[str, Any]:
+    def is_available(self, timeout: float = 2) -> bool:
+        """
+        Check that the Ollama server is reachable.
+        
+        The probe goes through the shared pooled session, so later generate
+        calls reuse the connection it opens.
+        
+        Args:
+            timeout: Connect and read timeout in seconds
+            
+        Returns:
+            True if Ollama answered /api/tags with 200
+        """
+        try:
+            response = _get_session().get(f"{self.base_url}/api/tags", timeout=timeout)
+            return response.status_code == 200
+        except Exception:
+            return False
+    
+    def _embed(self, text: str) -> Optional[Any]:
+        """Return a unit-length numpy embedding for text, or None if unavailable."""
+        try:
+            import numpy as np
+            response = _get_session().post(
+                f"{self.base_url}/api/embeddings",
+                json={"model": _EMBED_MODEL, "prompt": text},
+                timeout=_TIMEOUT
+            )
+            response.raise_for_status()
+            vector = np.asarray(response.json().get("embedding", []), dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            return vector / norm if norm else None
+        except Exception:
+            return None
+    
+    def _semantic_lookup(self, context: bytes, embedding) -> Optional[str]:
+        """Find a cached response for context whose embedding is close enough."""
+        if embedding is None:
+            return None
+        
+        best_score, best_response = _SEMANTIC_THRESHOLD, None
+        for entry_context, entry_embedding, entry_response in self._semantic_cache:
+            if entry_context != context or entry_embedding.shape != embedding.shape:
+                continue
+            score = float(entry_embedding.dot(embedding))
+            if score >= best_score:
+                best_score, best_response = score, entry_response
+        return best_response
+    
+    def _semantic_store(self, context: bytes, embedding, response_text: str) -> None:
+        """Remember a response for future near-match lookups."""
+        if len(self._semantic_cache) >= _SEMANTIC_CACHE_SIZE:
+            self._semantic_cache.pop(0)
+        self._semantic_cache.append((context, embedding, response_text))
+    
+    def analyze_schema(self, schema_info: Dict[str, Any],
+                       schema_text: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze database schema to understand business context.
         
         Args:
             schema_info: Dictionary containing table and relationship information
+            schema_text: schema_info already formatted by _format_schema_for_llm
             
         Returns:
             Analysis with business insights and query suggestions
         """
         # Format schema for LLM
-        schema_text = self._format_schema_for_llm(schema_info)
+        if schema_text is None:
+            schema_text = self._format_schema_for_llm(schema_info)
         
         prompt = f"""You are a database analyst. Analyze this database schema and provide business insights.
 
@@ -125,13 +598,14 @@ Example format:
 
 Analyze the schema and return ONLY valid JSON:"""
         
-        response = self.generate(prompt, temperature=0.3)
+        response = self.generate(prompt, temperature=0.3, stop_at_json=True,
+                                 max_tokens=800, json_mode=True)
         
         # Parse JSON response
         try:
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
+            analysis = _parse_first_json(response)
+            if analysis is not None:
+                return analysis
             else:
                 return {
                     "business_domain": "unknown",
@@ -150,7 +624,8 @@ Analyze the schema and return ONLY valid JSON:"""
             }
     
     def generate_sql_query(self, user_intent: str, schema_info: Dict[str, Any], 
-                          database_type: str = "sqlite") -> Dict[str, Any]:
+                          database_type: str = "sqlite",
+                          schema_text: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate SQL query based on user intent and schema.
         
@@ -158,17 +633,124 @@ Analyze the schema and return ONLY valid JSON:"""
             user_intent: Natural language description of what user wants
             schema_info: Database schema information
             database_type: Type of database (sqlite, postgres, mysql)
+            schema_text: schema_info already formatted by _format_schema_for_llm
             
         Returns:
             Dictionary with SQL query and metadata
         """
-        schema_text = self._format_schema_for_llm(schema_info)
+        if schema_text is None:
+            schema_text = self._format_schema_for_llm(schema_info)
+        prompt, system_message = self._build_sql_prompt(user_intent, schema_text, database_type)
         
-        system_message = f"""You are an expert SQL developer for {database_type} databases.
-Generate precise, optimized SQL queries based on user requests.
-Follow {database_type} syntax strictly.
-Include appropriate JOINs, aggregations, and filters.
-Consider performance implications."""
+        response = self.generate(prompt, system=system_message, temperature=0.2, stop_at_json=True,
+                                 max_tokens=1024, json_schema=_SQL_QUERY_SCHEMA,
+                                 semantic_text=user_intent)
+        return self._parse_sql_response(response)
+    
+    def generate_sql_queries(self, user_intents: List[str], schema_info: Dict[str, Any],
+                            database_type: str = "sqlite",
+                            schema_text: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Generate SQL queries for several intents in one concurrent round.
+        
+        Args:
+            user_intents: Natural language descriptions, one per query
+            schema_info: Database schema information
+            database_type: Type of database (sqlite, postgres, mysql)
+            schema_text: schema_info already formatted by _format_schema_for_llm
+            
+        Returns:
+            List of query dictionaries, in the same order as user_intents
+        """
+        if schema_text is None:
+            schema_text = self._format_schema_for_llm(schema_info)
+        requests_batch = []
+        for user_intent in user_intents:
+            prompt, system_message = self._build_sql_prompt(user_intent, schema_text, database_type)
+            requests_batch.append((prompt, system_message, 0.2))
+        
+        responses = self.generate_batch(requests_batch, stop_at_json=True,
+                                        max_tokens=1024, json_schema=_SQL_QUERY_SCHEMA)
+        return [self._parse_sql_response(response) for response in responses]
+    
+    def generate_sql_queries_combined(self, user_intents: List[str], schema_info: Dict[str, Any],
+                                      database_type: str = "sqlite",
+                                      schema_text: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Generate SQL queries for several intents with a single prompt.
+        
+        The schema is sent once for all intents instead of once per intent.
+        Intents the combined response does not answer are generated
+        individually via generate_sql_queries.
+        
+        Args:
+            user_intents: Natural language descriptions, one per query
+            schema_info: Database schema information
+            database_type: Type of database (sqlite, postgres, mysql)
+            schema_text: schema_info already formatted by _format_schema_for_llm
+            
+        Returns:
+            List of query dictionaries, in the same order as user_intents
+        """
+        if schema_text is None:
+            schema_text = self._format_schema_for_llm(schema_info)
+        if len(user_intents) < 2:
+            return self.generate_sql_queries(user_intents, schema_info, database_type, schema_text)
+        
+        prompt, system_message = self._build_sql_batch_prompt(user_intents, schema_text, database_type)
+        response = self.generate(prompt, system=system_message, temperature=0.2, stop_at_json=True,
+                                 max_tokens=min(4096, 512 * len(user_intents)),
+                                 json_schema=_SQL_BATCH_SCHEMA)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(user_intents)
+        try:
+            parsed = _parse_first_json(response)
+            items = parsed.get("results", []) if isinstance(parsed, dict) else []
+            for position, item in enumerate(items[:len(user_intents)]):
+                if isinstance(item, dict) and item.get("query"):
+                    item["query"] = self._clean_sql(item["query"])
+                    results[position] = item
+        except Exception:
+            pass
+        
+        missing = [position for position, result in enumerate(results) if result is None]
+        if missing:
+            retried = self.generate_sql_queries([user_intents[position] for position in missing],
+                                                schema_info, database_type, schema_text)
+            for position, result in zip(missing, retried):
+                results[position] = result
+        return results
+    
+    def generate_batch(self, prompts: List[Tuple[str, Optional[str], float]],
+                       max_workers: int = _PARALLEL_SLOTS, **generate_kwargs) -> List[str]:
+        """
+        Run several independent generations concurrently.
+        
+        Ollama serves up to OLLAMA_NUM_PARALLEL requests at once and batches
+        their token generation, so concurrent requests finish well before the
+        same requests issued one after another. Requests beyond that limit
+        wait for a free slot on this side.
+        
+        Args:
+            prompts: (prompt, system, temperature) tuples
+            max_workers: Maximum number of worker threads
+            **generate_kwargs: Passed through to generate() (stop_at_json, max_tokens, ...)
+            
+        Returns:
+            Generated responses, in the same order as prompts
+        """
+        if not prompts:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+            return list(pool.map(
+                lambda args: self.generate(*args, **generate_kwargs),
+                prompts
+            ))
+    
+    def _build_sql_prompt(self, user_intent: str, schema_text: str, database_type: str) -> Tuple[str, str]:
+        """Build the (prompt, system message) pair for SQL generation."""
+        system_message = self._sql_system_message(database_type)
         
         prompt = f"""Given this database schema:
 {schema_text}
@@ -181,6 +763,7 @@ Return your response in this JSON format:
 {{
     "query": "SELECT ...",
     "description": "Brief description of what the query does",
+    "explanation": "What the query does, in plain language for a business user",
     "intent_type": "overview|aggregation|distribution|relationship|time_series|comparison|ranking|detail",
     "tables_used": ["table1", "table2"],
     "visualization_hint": "bar|line|pie|scatter|table|heatmap",
@@ -191,20 +774,64 @@ Return your response in this JSON format:
 
 Generate the SQL query:"""
         
-        response = self.generate(prompt, system=system_message, temperature=0.2)
+        return prompt, system_message
+    
+    def _sql_system_message(self, database_type: str) -> str:
+        """System message shared by single and combined SQL generation prompts."""
+        return f"""You are an expert SQL developer for {database_type} databases.
+Generate precise, optimized SQL queries based on user requests.
+Follow {database_type} syntax strictly.
+Include appropriate JOINs, aggregations, and filters.
+Consider performance implications."""
+    
+    def _build_sql_batch_prompt(self, user_intents: List[str], schema_text: str,
+                                database_type: str) -> Tuple[str, str]:
+        """Build the (prompt, system message) pair for several SQL requests at once."""
+        system_message = self._sql_system_message(database_type)
+        requests_text = "\n".join(f'{number}. "{user_intent}"'
+                                  for number, user_intent in enumerate(user_intents, 1))
         
-        # Parse response
+        prompt = f"""Given this database schema:
+{schema_text}
+
+User Requests:
+{requests_text}
+
+Generate one SQL query for each request, in the same order.
+
+Return your response in this JSON format, with one entry per request:
+{{
+    "results": [
+        {{
+            "query": "SELECT ...",
+            "description": "Brief description of what the query does",
+            "explanation": "What the query does, in plain language for a business user",
+            "intent_type": "overview|aggregation|distribution|relationship|time_series|comparison|ranking|detail",
+            "tables_used": ["table1", "table2"],
+            "visualization_hint": "bar|line|pie|scatter|table|heatmap",
+            "expected_columns": ["column1", "column2"],
+            "has_aggregation": true/false,
+            "has_time_component": true/false
+        }}
+    ]
+}}
+
+Generate the SQL queries:"""
+        
+        return prompt, system_message
+    
+    def _parse_sql_response(self, response: str) -> Dict[str, Any]:
+        """Parse an SQL generation response into a query dictionary."""
         try:
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
+            result = _parse_first_json(response)
+            if result is not None:
                 # Validate and clean SQL
                 if "query" in result:
                     result["query"] = self._clean_sql(result["query"])
                 return result
             else:
                 # Fallback: try to extract SQL directly
-                sql_match = re.search(r'(SELECT.*?;)', response, re.IGNORECASE | re.DOTALL)
+                sql_match = _SQL_EXTRACT_RE.search(response)
                 if sql_match:
                     return {
                         "query": self._clean_sql(sql_match.group(1)),
@@ -235,17 +862,41 @@ Generate the SQL query:"""
                 "reason": "No data available"
             }
         
-        columns = list(data_sample[0].keys()) if data_sample else []
+        columns = list(data_sample[0])
         row_count = len(data_sample)
         
-        # Analyze data types
+        # Analyze data types in a single pass over the sample rows, pulling
+        # all columns of a row at once with one itemgetter call
+        first_values = {}
+        all_numeric = {}
+        getter = itemgetter(*columns) if columns else None
+        for row in data_sample[:5] if getter else ():
+            try:
+                values = getter(row)
+                if len(columns) == 1:
+                    values = (values,)
+            except KeyError:
+                values = [row.get(col) for col in columns]
+            for col, value in zip(columns, values):
+                if value is None:
+                    continue
+                if col not in first_values:
+                    first_values[col] = value
+                    all_numeric[col] = True
+                if all_numeric[col] and not isinstance(value, (int, float)):
+                    all_numeric[col] = False
+        
         data_types = {}
         for col in columns:
-            sample_values = [row.get(col) for row in data_sample[:5] if row.get(col) is not None]
-            if sample_values:
-                if all(isinstance(v, (int, float)) for v in sample_values):
-                    data_types[col] = "numeric"
-                elif any(d in str(sample_values[0]).lower() for d in ["date", "time", "-", "/"]):
+            if col not in first_values:
+                continue
+            if all_numeric[col]:
+                data_types[col] = "numeric"
+            else:
+                first_text = str(first_values[col])
+                if "-" in first_text or "/" in first_text or any(
+                    d in first_text.lower() for d in ("date", "time")
+                ):
                     data_types[col] = "temporal"
                 else:
                     data_types[col] = "categorical"
@@ -253,15 +904,13 @@ Generate the SQL query:"""
         prompt = f"""You are a data visualization expert. Recommend the best chart type for this data.
 
 DATA CHARACTERISTICS:
-- Columns: {columns}
-- Data types: {json.dumps(data_types)}
 - Row count: {row_count}
 - Query type: {query_metadata.get('intent_type', 'unknown')}
 - Has aggregation: {query_metadata.get('has_aggregation', False)}
 - Has time component: {query_metadata.get('has_time_component', False)}
 
-SAMPLE DATA (first 3 rows):
-{json.dumps(data_sample[:3], indent=2)}
+COLUMNS:
+{_json_dumps(self._describe_columns(data_sample, columns, data_types), indent=True)}
 
 Available chart types: bar, line, pie, scatter, table, heatmap
 
@@ -278,19 +927,55 @@ Return JSON with:
 
 Recommend visualization:"""
         
-        response = self.generate(prompt, temperature=0.3)
+        response = self.generate(prompt, temperature=0.3, stop_at_json=True,
+                                 max_tokens=400, json_mode=True)
         
         # Parse response
         try:
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
+            recommendation = _parse_first_json(response)
+            if recommendation is not None:
+                return recommendation
             else:
                 # Fallback recommendation
                 return self._fallback_visualization_recommendation(data_types, query_metadata)
         except Exception:
             return self._fallback_visualization_recommendation(data_types, query_metadata)
     
+    def _describe_columns(self, data_sample: List[Dict], columns: List[str],
+                          data_types: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Summarize each column instead of sending raw rows to the LLM.
+        
+        Reads at most _DESCRIBE_ROWS rows once, so the prompt grows with the
+        number of columns rather than rows times columns.
+        """
+        descriptors = {
+            col: {"name": col, "type": data_types.get(col, "unknown"), "examples": [], "distinct": set()}
+            for col in columns
+        }
+        for row in data_sample[:_DESCRIBE_ROWS]:
+            for col, descriptor in descriptors.items():
+                value = row.get(col)
+                if value is None:
+                    continue
+                if not isinstance(value, (str, int, float, bool)):
+                    value = str(value)
+                distinct = descriptor["distinct"]
+                if len(distinct) < _DISTINCT_CAP and value not in distinct:
+                    distinct.add(value)
+                    if len(descriptor["examples"]) < 3:
+                        if isinstance(value, str) and len(value) > _EXAMPLE_CHARS:
+                            value = f"{value[:_EXAMPLE_CHARS]}..."
+                        descriptor["examples"].append(value)
+                if descriptor["type"] == "numeric" and isinstance(value, (int, float)):
+                    descriptor["min"] = min(descriptor.get("min", value), value)
+                    descriptor["max"] = max(descriptor.get("max", value), value)
+        
+        for descriptor in descriptors.values():
+            distinct_count = len(descriptor.pop("distinct"))
+            descriptor["distinct_values"] = f"{_DISTINCT_CAP}+" if distinct_count >= _DISTINCT_CAP else distinct_count
+        return list(descriptors.values())
+    
     def explain_query(self, sql_query: str) -> str:
         """
         Explain what a SQL query does in plain language.
@@ -307,7 +992,7 @@ Recommend visualization:"""
 
 Provide a brief, clear explanation that a business user would understand:"""
         
-        response = self.generate(prompt, temperature=0.3)
+        response = self.generate(prompt, temperature=0.3, max_tokens=256)
         
         if response.startswith("Error:"):
             return "This query retrieves data from the database."
@@ -316,37 +1001,34 @@ Provide a brief, clear explanation that a business user would understand:"""
     
     def _format_schema_for_llm(self, schema_info: Dict[str, Any]) -> str:
         """Format schema information for LLM consumption."""
-        lines = []
-        
-        tables = schema_info.get("tables", [])
-        for table in tables:
-            lines.append(f"Table: {table.get('name', 'unknown')}")
-            columns = table.get("columns", [])
-            for col in columns:
-                col_def = f"  - {col.get('name', 'unknown')}: {col.get('type', 'unknown')}"
-                if col.get("primary_key"):
-                    col_def += " [PRIMARY KEY]"
-                if col.get("foreign_key"):
-                    col_def += f" [FK -> {col['foreign_key']}]"
-                if col.get("nullable") == False:
-                    col_def += " [NOT NULL]"
-                lines.append(col_def)
-            lines.append("")
+        return "\n".join(self._iter_schema_lines(schema_info))
+    
+    def _iter_schema_lines(self, schema_info: Dict[str, Any]):
+        """Yield the lines of the LLM schema description."""
+        for table in schema_info.get("tables", []):
+            yield f"Table: {table.get('name', 'unknown')}"
+            for col in table.get("columns", []):
+                get = col.get
+                foreign_key = get("foreign_key")
+                yield (
+                    f"  - {get('name', 'unknown')}: {get('type', 'unknown')}"
+                    f"{' [PRIMARY KEY]' if get('primary_key') else ''}"
+                    f"{f' [FK -> {foreign_key}]' if foreign_key else ''}"
+                    f"{' [NOT NULL]' if get('nullable') == False else ''}"
+                )
+            yield ""
         
         relationships = schema_info.get("relationships", [])
         if relationships:
-            lines.append("Relationships:")
+            yield "Relationships:"
             for rel in relationships:
-                lines.append(f"  - {rel.get('from_table', '?')}.{rel.get('from_column', '?')} -> "
-                           f"{rel.get('to_table', '?')}.{rel.get('to_column', '?')}")
-        
-        return "\n".join(lines)
+                yield (f"  - {rel.get('from_table', '?')}.{rel.get('from_column', '?')} -> "
+                       f"{rel.get('to_table', '?')}.{rel.get('to_column', '?')}")
     
     def _clean_sql(self, sql: str) -> str:
         """Clean and format SQL query."""
         # Remove markdown code blocks if present
-        sql = re.sub(r'```sql?\s*', '', sql)
-        sql = re.sub(r'```', '', sql)
+        sql = _FENCE_RE.sub('', sql)
         
         # Remove extra whitespace
         sql = ' '.join(sql.split())
@@ -1,14 +1,185 @@
 """SQL Intelligence Agent using LLM for smart query generation and analysis."""
 
+import hashlib
 import json
-from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
-from enum import Enum
+import os
+import re
+import shelve
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from types import MappingProxyType
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Sequence, Tuple
+from dataclasses import dataclass, replace
+from functools import cached_property, lru_cache
 
-from .ollama_connector import OllamaConnector, QueryIntent
+try:
+    import orjson
+except ImportError:  # Optional speedup; stdlib json is used otherwise
+    orjson = None
 
+from .intents import QueryIntent
+from .ollama_connector import OllamaConnector, _json_dumps, _parse_first_json
 
-@dataclass
+# Generated plans are reused for an hour per (schema, database, intent)
+_PLAN_CACHE_TTL = 3600.0
+_PLAN_CACHE_SIZE = 512
+
+# Persisted schema analyses (see cache_dir) are reused for a day
+_ANALYSIS_TTL = 86400.0
+
+# Cosine similarity above which a differently worded intent reuses a plan
+_INTENT_SIMILARITY = 0.9
+
+# Column type fragments (lowercase) used to classify columns
+_CATEGORICAL_TYPES = ("varchar", "text")
+_TEMPORAL_TYPES = ("date", "time", "timestamp")
+_SCHEMA_INDEX_CACHE_SIZE = 64
+
+# Columns per sample row included in data insight prompts, and characters
+# kept of each sampled text value
+_MAX_SAMPLE_COLS = 20
+_MAX_SAMPLE_CHARS = 200
+
+# Static prompt pieces, joined around the per-call parts. The optimization
+# prompt starts with the schema so its prefix is shared by every query
+# optimized against the same schema.
+_OPTIMIZE_PROMPT_HEAD = """You are a SQL optimization expert. Analyze this query and suggest improvements.
+
+SCHEMA:
+"""
+_OPTIMIZE_PROMPT_MID = """
+
+QUERY:
+"""
+_OPTIMIZE_PROMPT_TAIL = """
+
+Provide optimization suggestions in JSON format:
+{
+    "optimized_query": "improved SQL query",
+    "improvements": ["list of improvements made"],
+    "performance_tips": ["performance considerations"],
+    "indexes_suggested": ["suggested indexes if applicable"]
+}
+
+Optimize the query:"""
+
+# Structured-output schema for optimization responses (see OllamaConnector.generate)
+_OPTIMIZE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "optimized_query": {"type": "string"},
+        "improvements": {"type": "array", "items": {"type": "string"}},
+        "performance_tips": {"type": "array", "items": {"type": "string"}},
+        "indexes_suggested": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["optimized_query", "improvements", "performance_tips", "indexes_suggested"]
+}
+
+_INSIGHTS_PROMPT_HEAD = """Analyze this data and provide key business insights.
+
+QUERY:
+"""
+_INSIGHTS_PROMPT_MID = """
+
+DATA SUMMARY:
+"""
+_INSIGHTS_PROMPT_TAIL = """
+
+Provide 2-3 key insights in plain language that a business user would find valuable:"""
+
+# Dashboard suggestions per business domain (read-only, shared by all agents)
+_DASHBOARD_RECS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "e-commerce": (
+        "Sales Performance Dashboard",
+        "Customer Analytics Dashboard",
+        "Product Performance Dashboard",
+        "Order Fulfillment Dashboard"
+    ),
+    "finance": (
+        "Financial Overview Dashboard",
+        "Transaction Analysis Dashboard",
+        "Risk Analytics Dashboard",
+        "Portfolio Performance Dashboard"
+    ),
+    "healthcare": (
+        "Patient Analytics Dashboard",
+        "Clinical Operations Dashboard",
+        "Resource Utilization Dashboard",
+        "Quality Metrics Dashboard"
+    ),
+    "manufacturing": (
+        "Production Overview Dashboard",
+        "Quality Control Dashboard",
+        "Supply Chain Dashboard",
+        "Equipment Performance Dashboard"
+    )
+})
+_DEFAULT_DASHBOARDS = (
+    "Overview Dashboard",
+    "Analytics Dashboard",
+    "Performance Dashboard",
+    "Insights Dashboard"
+)
+
+# Intents produced by the _*_intents helpers, answered from templates
+_TEMPLATE_INTENTS = (
+    (re.compile(r"Show overview statistics for (\w+)"), "overview"),
+    (re.compile(r"Show distribution of (\w+) in (\w+)"), "distribution"),
+    (re.compile(r"Show trends over time using (\w+) from (\w+)"), "time_series"),
+)
+
+_INTENT_MAPPING: Mapping[str, QueryIntent] = MappingProxyType({
+    "overview": QueryIntent.OVERVIEW,
+    "aggregation": QueryIntent.AGGREGATION,
+    "distribution": QueryIntent.DISTRIBUTION,
+    "relationship": QueryIntent.RELATIONSHIP,
+    "time_series": QueryIntent.TIME_SERIES,
+    "comparison": QueryIntent.COMPARISON,
+    "ranking": QueryIntent.RANKING,
+    "detail": QueryIntent.DETAIL
+})
+
+
+@lru_cache(maxsize=256)
+def _classify_column_type(col_type: str) -> Tuple[bool, bool]:
+    """Return (is_categorical, is_temporal) for a column type string."""
+    col_type = col_type.lower()
+    return (any(t in col_type for t in _CATEGORICAL_TYPES),
+            any(t in col_type for t in _TEMPORAL_TYPES))
+
+
+def _clip_value(value: Any) -> Any:
+    """Shorten long text values so a single cell cannot bloat a prompt."""
+    if isinstance(value, str) and len(value) > _MAX_SAMPLE_CHARS:
+        return f"{value[:_MAX_SAMPLE_CHARS]}..."
+    return value
+
+
+def _quote_identifier(identifier: str, database_type: str) -> str:
+    """Quote a table or column name for the dialect, like SQLGenerator does."""
+    if database_type == "mysql":
+        return "`" + identifier.replace("`", "``") + "`"
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _value_kind(value: Any) -> str:
+    """Classify a result value as numeric, temporal or categorical."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "numeric"
+    if isinstance(value, date):
+        return "temporal"
+    if isinstance(value, str) and value[4:5] == "-":
+        try:
+            datetime.fromisoformat(value)
+            return "temporal"
+        except ValueError:
+            pass
+    return "categorical"
+
+
+@dataclass(slots=True)
 class QueryPlan:
     """Represents a planned SQL query with metadata."""
     query: str
@@ -19,6 +190,18 @@ class QueryPlan:
     explanation: str
     tables_used: List[str]
     expected_columns: List[str]
+    cache_hit: bool = False  # Reused from a similarly worded intent
+
+
+@dataclass(slots=True)
+class SchemaIndex:
+    """Column classifications for a schema, computed in one pass and reused."""
+    categorical: List[Tuple[str, str]]  # (table, column)
+    temporal: List[Tuple[str, str]]  # (table, column)
+    fk_counts: Dict[str, int]
+    columns: Dict[str, frozenset]  # table -> column names
+    main_fact: Optional[Dict]
+    formatted_llm: str  # Schema preamble shared by every prompt about this schema
 
 
 class SQLIntelligenceAgent:
@@ -30,35 +213,69 @@ class SQLIntelligenceAgent:
     - Visualization recommendations
     """
     
-    def __init__(self, llm_model: str = "llama3", ollama_url: str = "http://localhost:11434"):
+    def __init__(self, llm_model: str = "llama3", ollama_url: str = "http://localhost:11434",
+                 enable_semantic_cache: bool = False, history_max: int = 1024,
+                 cache_dir: Optional[str] = None):
         """
         Initialize SQL Intelligence Agent.
         
         Args:
             llm_model: Ollama model to use
             ollama_url: Ollama API URL
+            enable_semantic_cache: Also reuse plans for similarly worded intents
+                (requires the nomic-embed-text model and numpy)
+            history_max: Number of generated queries kept in query_history
+            cache_dir: Directory for persisting schema analyses across restarts
+                (disabled when None)
         """
-        self.llm = OllamaConnector(model=llm_model, base_url=ollama_url)
+        # The intent-level plan cache below replaces the connector's semantic tier
+        self._llm_kwargs = dict(model=llm_model, base_url=ollama_url)
+        self.enable_semantic_cache = enable_semantic_cache
         self.schema_cache = {}
-        self.query_history = []
+        self.cache_dir = cache_dir
+        self.query_history: deque = deque(maxlen=history_max)  # (intent, query, time_ns)
+        self._plan_cache: Dict[str, Tuple[float, Any]] = {}  # key -> (expires_at, value)
+        # schema key -> [plan keys, unit embeddings, stacked embedding matrix or None]
+        self._intent_embeddings: Dict[str, list] = {}
+        self._schema_index_cache: Dict[str, SchemaIndex] = {}
+    
+    @cached_property
+    def llm(self) -> OllamaConnector:
+        """Ollama connector, created on first use."""
+        return OllamaConnector(**self._llm_kwargs)
     
-    def analyze_business_context(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_business_context(self, schema: Dict[str, Any],
+                                 schema_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze schema to understand business context and opportunities.
         
         Args:
             schema: Database schema information
+            schema_hash: _hash_schema(schema), if the caller already computed it
             
         Returns:
             Business analysis with insights and recommendations
         """
         print("🧠 [Agent] Analyzing business context...")
         
+        if schema_hash is None:
+            schema_hash = self._hash_schema(schema)
+        
+        # Reuse an earlier successful analysis of the same schema, from memory or disk
+        cached = self.schema_cache.get(schema_hash)
+        if cached is not None and cached["analysis"].get("business_domain", "unknown") != "unknown":
+            return cached["analysis"]
+        analysis = self._load_analysis(schema_hash)
+        if analysis is not None:
+            self.schema_cache[schema_hash] = {"schema": schema, "analysis": analysis}
+            return analysis
+        
         # Use LLM to analyze schema
-        analysis = self.llm.analyze_schema(schema)
+        analysis = self.llm.analyze_schema(
+            schema, schema_text=self._schema_index(schema, schema_hash).formatted_llm
+        )
         
         # Cache schema for future use
-        schema_hash = self._hash_schema(schema)
         self.schema_cache[schema_hash] = {
             "schema": schema,
             "analysis": analysis
@@ -71,6 +288,10 @@ class SQLIntelligenceAgent:
                 analysis.get("key_entities", [])
             )
         
+        # The "unknown" domain marks the fallback returned when the LLM failed
+        if analysis.get("business_domain", "unknown") != "unknown":
+            self._store_analysis(schema_hash, analysis)
+        
         return analysis
     
     def generate_query_from_intent(self, 
@@ -88,38 +309,121 @@ class SQLIntelligenceAgent:
         Returns:
             QueryPlan with generated query and metadata
         """
-        print(f"🤖 [Agent] Generating query for: {user_intent}")
-        
-        # Generate SQL using LLM
-        result = self.llm.generate_sql_query(user_intent, schema, database_type)
-        
-        if "error" in result:
-            print(f"❌ [Agent] Error generating query: {result['error']}")
-            return self._create_fallback_query(user_intent, schema)
-        
-        # Get explanation
-        explanation = self.llm.explain_query(result.get("query", ""))
-        
-        # Create query plan
-        query_plan = QueryPlan(
-            query=result.get("query", ""),
-            description=result.get("description", user_intent),
-            intent=self._map_intent_type(result.get("intent_type", "overview")),
-            visualization_type=result.get("visualization_hint", "table"),
-            confidence=0.8 if "query" in result else 0.3,
-            explanation=explanation,
-            tables_used=result.get("tables_used", []),
-            expected_columns=result.get("expected_columns", [])
+        return self.generate_queries_from_intents([user_intent], schema, database_type)[0]
+    
+    def generate_queries_from_intents(self,
+                                      user_intents: List[str],
+                                      schema: Dict[str, Any],
+                                      database_type: str = "sqlite",
+                                      schema_hash: Optional[str] = None) -> List[QueryPlan]:
+        """
+        Generate SQL queries for several intents, sending uncached ones to the LLM together.
+        
+        Args:
+            user_intents: Natural language descriptions
+            schema: Database schema
+            database_type: Target database type
+            schema_hash: _hash_schema(schema), if the caller already computed it
+            
+        Returns:
+            QueryPlans in the same order as user_intents
+        """
+        if schema_hash is None:
+            schema_hash = self._hash_schema(schema)
+        schema_key = f"{schema_hash}|{database_type}"
+        plans: List[Optional[QueryPlan]] = [None] * len(user_intents)
+        pending: Dict[str, tuple] = {}  # plan key -> (positions, embedding)
+        
+        for position, user_intent in enumerate(user_intents):
+            print(f"🤖 [Agent] Generating query for: {user_intent}")
+            plan_key = f"plan|{schema_key}|{user_intent.strip().lower()}"
+            if plan_key in pending:
+                # Repeated intent in this batch; generate it once
+                pending[plan_key][0].append(position)
+                continue
+            cached = self._cache_get(plan_key)
+            
+            if cached is None:
+                # Intents this agent synthesizes itself need no LLM round-trip
+                cached = self._template_plan(user_intent, self._schema_index(schema, schema_hash),
+                                             database_type)
+                if cached is not None:
+                    self.query_history.append((user_intent, cached.query, time.time_ns()))
+                    self._cache_put(plan_key, cached)
+            
+            embedding = None
+            if cached is None and self.enable_semantic_cache:
+                embedding = self.llm._embed(user_intent)
+                cached = self._similar_plan(schema_key, embedding)
+            
+            if cached is not None:
+                plans[position] = cached
+            else:
+                pending[plan_key] = ([position], embedding)
+        
+        if not pending:
+            return plans
+        
+        # Generate SQL for all cache misses with one combined prompt
+        results = self.llm.generate_sql_queries_combined(
+            [user_intents[positions[0]] for positions, _ in pending.values()], schema, database_type,
+            schema_text=self._schema_index(schema, schema_hash).formatted_llm
         )
         
-        # Store in history
-        self.query_history.append({
-            "intent": user_intent,
-            "query": query_plan.query,
-            "timestamp": self._get_timestamp()
-        })
+        # The generation prompt asks for the explanation too; only results
+        # that came back without one need a separate round trip
+        unexplained = [result for result in results
+                       if "error" not in result and not result.get("explanation")]
+        if unexplained:
+            with ThreadPoolExecutor(max_workers=min(4, len(unexplained))) as pool:
+                for result, explanation in zip(unexplained, pool.map(
+                        lambda result: self.llm.explain_query(result.get("query", "")), unexplained)):
+                    result["explanation"] = explanation
+        
+        for (plan_key, (positions, embedding)), result in zip(pending.items(), results):
+            user_intent = user_intents[positions[0]]
+            if "error" in result:
+                print(f"❌ [Agent] Error generating query: {result['error']}")
+                fallback = self._create_fallback_query(user_intent, schema)
+                for position in positions:
+                    plans[position] = fallback
+                continue
+            
+            query_plan = QueryPlan(
+                query=result.get("query", ""),
+                description=result.get("description", user_intent),
+                intent=self._map_intent_type(result.get("intent_type", "overview")),
+                visualization_type=result.get("visualization_hint", "table"),
+                confidence=0.8 if "query" in result else 0.3,
+                explanation=result["explanation"],
+                tables_used=result.get("tables_used", []),
+                expected_columns=result.get("expected_columns", [])
+            )
+            for position in positions:
+                plans[position] = query_plan
+            
+            # Store in history
+            self.query_history.append((user_intent, query_plan.query, time.time_ns()))
+            
+            self._cache_put(plan_key, query_plan)
+            if embedding is not None:
+                self._remember_intent(schema_key, embedding, plan_key)
         
-        return query_plan
+        return plans
+    
+    def history(self) -> Iterator[Dict[str, str]]:
+        """
+        Iterate over recently generated queries, oldest first.
+        
+        Yields:
+            Dictionaries with intent, query and ISO timestamp
+        """
+        for user_intent, query, timestamp_ns in list(self.query_history):
+            yield {
+                "intent": user_intent,
+                "query": query,
+                "timestamp": datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+            }
     
     def suggest_queries_for_schema(self, 
                                   schema: Dict[str, Any],
@@ -127,6 +431,9 @@ class SQLIntelligenceAgent:
         """
         Generate intelligent query suggestions based on schema.
         
+        All suggestions are generated in a single concurrent batch; set
+        OLLAMA_NUM_PARALLEL on the Ollama server so it serves them in parallel.
+        
         Args:
             schema: Database schema
             visualization_intents: Types of visualizations desired
@@ -136,32 +443,30 @@ class SQLIntelligenceAgent:
         """
         print("💡 [Agent] Generating intelligent query suggestions...")
         
-        # First analyze the schema
-        analysis = self.analyze_business_context(schema)
-        
-        suggestions = []
+        # Hash once for the analysis, the index and query generation
+        schema_hash = self._hash_schema(schema)
         
-        # Get LLM suggested queries
-        llm_suggestions = analysis.get("suggested_queries", [])
+        # First analyze the schema
+        analysis = self.analyze_business_context(schema, schema_hash)
         
-        # Convert each suggestion to a query
-        for suggestion in llm_suggestions[:5]:  # Limit to 5
-            query_plan = self.generate_query_from_intent(suggestion, schema)
-            suggestions.append(query_plan)
+        # Start from the LLM suggested queries
+        user_intents = list(analysis.get("suggested_queries", [])[:5])  # Limit to 5
         
         # Add specific queries based on visualization intents
         if visualization_intents:
+            index = self._schema_index(schema, schema_hash)
             for intent in visualization_intents:
                 if intent == "overview":
-                    suggestions.extend(self._generate_overview_queries(schema, analysis))
+                    user_intents.extend(self._overview_intents(index))
                 elif intent == "distribution":
-                    suggestions.extend(self._generate_distribution_queries(schema, analysis))
+                    user_intents.extend(self._distribution_intents(index))
                 elif intent == "time_series":
-                    suggestions.extend(self._generate_time_series_queries(schema, analysis))
+                    user_intents.extend(self._time_series_intents(index))
                 elif intent == "relationships":
-                    suggestions.extend(self._generate_relationship_queries(schema, analysis))
+                    user_intents.extend(self._relationship_intents(schema))
         
-        return suggestions[:10]  # Return top 10 suggestions
+        # Only the top 10 suggestions are returned, so don't generate more
+        return self.generate_queries_from_intents(user_intents[:10], schema, schema_hash=schema_hash)
     
     def optimize_query(self, query: str, schema: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -174,31 +479,26 @@ class SQLIntelligenceAgent:
         Returns:
             Optimization suggestions and improved query
         """
-        prompt = f"""You are a SQL optimization expert. Analyze this query and suggest improvements.
-
-SCHEMA:
-{self.llm._format_schema_for_llm(schema)}
-
-QUERY:
-{query}
-
-Provide optimization suggestions in JSON format:
-{{
-    "optimized_query": "improved SQL query",
-    "improvements": ["list of improvements made"],
-    "performance_tips": ["performance considerations"],
-    "indexes_suggested": ["suggested indexes if applicable"]
-}}
-
-Optimize the query:"""
+        schema_hash = self._hash_schema(schema)
+        cache_key = f"optimize|{schema_hash}|{query}"
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = "".join((
+            _OPTIMIZE_PROMPT_HEAD, self._schema_index(schema, schema_hash).formatted_llm,
+            _OPTIMIZE_PROMPT_MID, query, _OPTIMIZE_PROMPT_TAIL
+        ))
         
-        response = self.llm.generate(prompt, temperature=0.3)
+        # Stop generating as soon as the JSON object is complete
+        response = self.llm.generate(prompt, temperature=0.3, stop_at_json=True,
+                                     max_tokens=1024, json_schema=_OPTIMIZE_SCHEMA)
         
         try:
-            import re
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
+            optimization = _parse_first_json(response)
+            if optimization is not None:
+                self._cache_put(cache_key, optimization)
+                return optimization
         except Exception:
             pass
         
@@ -227,8 +527,11 @@ Optimize the query:"""
         if not query_metadata:
             query_metadata = {}
         
-        # Use LLM to recommend visualization
-        recommendation = self.llm.recommend_visualization(data_sample, query_metadata)
+        # Obvious result shapes are classified locally; only ambiguous ones
+        # are worth a round trip to the LLM
+        recommendation = self._rule_based_viz(data_sample)
+        if recommendation is None:
+            recommendation = self.llm.recommend_visualization(data_sample, query_metadata)
         
         # Enhance with specific configuration
         if recommendation.get("primary"):
@@ -240,6 +543,67 @@ Optimize the query:"""
         
         return recommendation
     
+    def _rule_based_viz(self, data_sample: List[Dict]) -> Optional[Dict[str, Any]]:
+        """
+        Recommend a chart for small, unambiguous result shapes without the LLM.
+        
+        Args:
+            data_sample: Sample of query results
+            
+        Returns:
+            Recommendation in the same shape as the LLM's, or None when the
+            shape is ambiguous and the LLM should decide
+        """
+        if not data_sample:
+            return None
+        
+        columns = list(data_sample[0])
+        kinds = {}
+        for row in data_sample[:5]:
+            for col in columns:
+                if col not in kinds and row.get(col) is not None:
+                    kinds[col] = _value_kind(row[col])
+        if len(kinds) != len(columns):
+            return None
+        
+        numeric = [col for col in columns if kinds[col] == "numeric"]
+        temporal = [col for col in columns if kinds[col] == "temporal"]
+        categorical = [col for col in columns if kinds[col] == "categorical"]
+        
+        if len(data_sample) == 1:
+            return {
+                "primary": "table",
+                "alternatives": [],
+                "reason": "A single row is best read as headline figures",
+                "x_axis": None,
+                "y_axis": None
+            }
+        if columns == numeric and len(numeric) == 1:
+            return {
+                "primary": "bar",
+                "alternatives": ["table"],
+                "reason": "A single measure is best shown as a distribution",
+                "x_axis": None,
+                "y_axis": numeric[0]
+            }
+        if len(columns) != 2 or len(numeric) != 1:
+            return None
+        if temporal:
+            return {
+                "primary": "line",
+                "alternatives": ["bar", "area"],
+                "reason": "Time series data is best shown with line charts",
+                "x_axis": temporal[0],
+                "y_axis": numeric[0]
+            }
+        return {
+            "primary": "bar",
+            "alternatives": ["pie", "table"],
+            "reason": "Categorical comparisons work well with bar charts",
+            "x_axis": categorical[0],
+            "y_axis": numeric[0]
+        }
+    
     def explain_data_insights(self, data: List[Dict], query: str) -> str:
         """
         Generate natural language insights from query results.
@@ -251,149 +615,191 @@ Optimize the query:"""
         Returns:
             Natural language insights
         """
+        return "".join(self.stream_data_insights(data, query)).strip()
+    
+    def stream_data_insights(self, data: List[Dict], query: str) -> Iterator[str]:
+        """
+        Generate natural language insights from query results as they are produced.
+        
+        Args:
+            data: Query results
+            query: Original SQL query
+            
+        Yields:
+            Pieces of the natural language insights
+        """
         if not data:
-            return "No data available for analysis."
+            yield "No data available for analysis."
+            return
         
-        # Prepare data summary
+        # Prepare data summary; wide rows are cut down to keep the prompt short
+        columns = list(data[0])
+        sample_columns = columns[:_MAX_SAMPLE_COLS]
         summary = {
             "row_count": len(data),
-            "columns": list(data[0].keys()) if data else [],
-            "sample": data[:3]
+            "columns": columns,
+            "sample": [{k: _clip_value(row.get(k)) for k in sample_columns} for row in data[:3]]
         }
         
-        prompt = f"""Analyze this data and provide key business insights.
-
-QUERY:
-{query}
-
-DATA SUMMARY:
-{json.dumps(summary, indent=2)}
-
-Provide 2-3 key insights in plain language that a business user would find valuable:"""
-        
-        response = self.llm.generate(prompt, temperature=0.5)
-        
-        if response.startswith("Error:"):
-            return f"The query returned {len(data)} results."
-        
-        return response
+        prompt = "".join((
+            _INSIGHTS_PROMPT_HEAD, query,
+            _INSIGHTS_PROMPT_MID, _json_dumps(summary, indent=True), _INSIGHTS_PROMPT_TAIL
+        ))
+        
+        pieces = self.llm.generate_stream(prompt, temperature=0.5)
+        first = next(pieces, "")
+        if first.startswith(("Error:", "LLM Error:")):
+            yield f"The query returned {len(data)} results."
+            return
+        
+        yield first
+        for piece in pieces:
+            # The connector ends a stream that failed part-way with its error
+            if piece.startswith(("Error:", "LLM Error:")):
+                yield f"\n\n⚠️ Insights incomplete - {piece}"
+                return
+            yield piece
     
-    def _generate_overview_queries(self, schema: Dict, analysis: Dict) -> List[QueryPlan]:
-        """Generate overview queries for the schema."""
-        queries = []
+    def _template_plan(self, user_intent: str, index: SchemaIndex,
+                       database_type: str = "sqlite") -> Optional[QueryPlan]:
+        """Build a plan without the LLM for intents matching _TEMPLATE_INTENTS."""
+        for pattern, kind in _TEMPLATE_INTENTS:
+            match = pattern.fullmatch(user_intent.strip())
+            if match:
+                break
+        else:
+            return None
         
-        # Find main fact table (usually has most foreign keys)
-        main_table = self._find_main_fact_table(schema)
-        if main_table:
-            intent = f"Show overview statistics for {main_table['name']}"
-            queries.append(self.generate_query_from_intent(intent, schema))
+        if kind == "overview":
+            table_name = match[1]
+            if table_name not in index.columns:
+                return None
+            return QueryPlan(
+                query=f"SELECT COUNT(*) AS total_rows FROM {_quote_identifier(table_name, database_type)};",
+                description=f"Overview statistics for {table_name}",
+                intent=QueryIntent.OVERVIEW,
+                visualization_type="table",
+                confidence=0.95,
+                explanation=f"Counts the rows in {table_name}",
+                tables_used=[table_name],
+                expected_columns=["total_rows"]
+            )
         
-        return queries
+        column_name, table_name = match[1], match[2]
+        if column_name not in index.columns.get(table_name, ()):
+            return None
+        # Names like "order", "user" or "count" are reserved words in some dialects
+        column_sql, table_sql = (_quote_identifier(name, database_type)
+                                 for name in (column_name, table_name))
+        count_sql = _quote_identifier("count", database_type)
+        if kind == "distribution":
+            return QueryPlan(
+                query=(f"SELECT {column_sql}, COUNT(*) AS {count_sql} FROM {table_sql} "
+                       f"GROUP BY {column_sql} ORDER BY {count_sql} DESC LIMIT 20;"),
+                description=f"Distribution of {column_name} in {table_name}",
+                intent=QueryIntent.DISTRIBUTION,
+                visualization_type="bar",
+                confidence=0.95,
+                explanation=f"Counts rows for the 20 most common values of {column_name}",
+                tables_used=[table_name],
+                expected_columns=[column_name, "count"]
+            )
+        return QueryPlan(
+            query=(f"SELECT {column_sql}, COUNT(*) AS {count_sql} FROM {table_sql} "
+                   f"GROUP BY {column_sql} ORDER BY {column_sql};"),
+            description=f"Trend over {column_name} in {table_name}",
+            intent=QueryIntent.TIME_SERIES,
+            visualization_type="line",
+            confidence=0.95,
+            explanation=f"Counts rows for each {column_name} value, in time order",
+            tables_used=[table_name],
+            expected_columns=[column_name, "count"]
+        )
     
-    def _generate_distribution_queries(self, schema: Dict, analysis: Dict) -> List[QueryPlan]:
-        """Generate distribution analysis queries."""
-        queries = []
-        
-        # Look for categorical columns
-        for table in schema.get("tables", []):
-            categorical_cols = [
-                col for col in table.get("columns", [])
-                if "varchar" in col.get("type", "").lower() or "text" in col.get("type", "").lower()
-            ]
-            
-            if categorical_cols and len(categorical_cols) > 0:
-                col = categorical_cols[0]
-                intent = f"Show distribution of {col['name']} in {table['name']}"
-                queries.append(self.generate_query_from_intent(intent, schema))
-                break
-        
-        return queries
+    def _overview_intents(self, index: SchemaIndex) -> List[str]:
+        """Overview query intents for the schema."""
+        # Main fact table (usually has most foreign keys)
+        if index.main_fact:
+            return [f"Show overview statistics for {index.main_fact['name']}"]
+        return []
     
-    def _generate_time_series_queries(self, schema: Dict, analysis: Dict) -> List[QueryPlan]:
-        """Generate time series queries."""
-        queries = []
-        
-        # Look for date/time columns
-        for table in schema.get("tables", []):
-            time_cols = [
-                col for col in table.get("columns", [])
-                if any(t in col.get("type", "").lower() for t in ["date", "time", "timestamp"])
-            ]
-            
-            if time_cols:
-                col = time_cols[0]
-                intent = f"Show trends over time using {col['name']} from {table['name']}"
-                queries.append(self.generate_query_from_intent(intent, schema))
-                break
-        
-        return queries
+    def _distribution_intents(self, index: SchemaIndex) -> List[str]:
+        """Distribution analysis query intents."""
+        if index.categorical:
+            table_name, column_name = index.categorical[0]
+            return [f"Show distribution of {column_name} in {table_name}"]
+        return []
     
-    def _generate_relationship_queries(self, schema: Dict, analysis: Dict) -> List[QueryPlan]:
-        """Generate relationship analysis queries."""
-        queries = []
-        
+    def _time_series_intents(self, index: SchemaIndex) -> List[str]:
+        """Time series query intents."""
+        if index.temporal:
+            table_name, column_name = index.temporal[0]
+            return [f"Show trends over time using {column_name} from {table_name}"]
+        return []
+    
+    def _relationship_intents(self, schema: Dict) -> List[str]:
+        """Relationship analysis query intents."""
         relationships = schema.get("relationships", [])
         if relationships:
             rel = relationships[0]
-            intent = f"Analyze relationship between {rel['from_table']} and {rel['to_table']}"
-            queries.append(self.generate_query_from_intent(intent, schema))
-        
-        return queries
+            return [f"Analyze relationship between {rel['from_table']} and {rel['to_table']}"]
+        return []
     
     def _find_main_fact_table(self, schema: Dict) -> Optional[Dict]:
         """Find the main fact table (usually has most foreign keys)."""
-        tables = schema.get("tables", [])
-        if not tables:
-            return None
-        
-        # Count foreign keys per table
+        return self._schema_index(schema).main_fact
+    
+    def _schema_index(self, schema: Dict, schema_hash: Optional[str] = None) -> SchemaIndex:
+        """Return the SchemaIndex for schema, building it on first use."""
+        if schema_hash is None:
+            schema_hash = self._hash_schema(schema)
+        index = self._schema_index_cache.get(schema_hash)
+        if index is None:
+            if len(self._schema_index_cache) >= _SCHEMA_INDEX_CACHE_SIZE:
+                self._schema_index_cache.pop(next(iter(self._schema_index_cache)))
+            index = self._build_schema_index(schema)
+            self._schema_index_cache[schema_hash] = index
+        return index
+    
+    def _build_schema_index(self, schema: Dict) -> SchemaIndex:
+        """Classify every column and count foreign keys in a single pass."""
+        categorical = []
+        temporal = []
         fk_counts = {}
-        for table in tables:
-            fk_count = sum(1 for col in table.get("columns", []) if col.get("foreign_key"))
-            fk_counts[table["name"]] = fk_count
+        columns = {}
+        main_fact = None
+        best_fk_count = -1
         
-        # Return table with most foreign keys
-        if fk_counts:
-            main_table_name = max(fk_counts, key=fk_counts.get)
-            return next((t for t in tables if t["name"] == main_table_name), None)
-        
-        return tables[0] if tables else None
+        for table in schema.get("tables", []):
+            table_name = table["name"]
+            fk_count = 0
+            for col in table.get("columns", []):
+                is_categorical, is_temporal = _classify_column_type(col.get("type", ""))
+                if is_categorical:
+                    categorical.append((table_name, col["name"]))
+                if is_temporal:
+                    temporal.append((table_name, col["name"]))
+                if col.get("foreign_key"):
+                    fk_count += 1
+            
+            fk_counts[table_name] = fk_count
+            columns[table_name] = frozenset(col["name"] for col in table.get("columns", []))
+            # Strictly greater keeps the first table on ties
+            if fk_count > best_fk_count:
+                best_fk_count, main_fact = fk_count, table
+        
+        return SchemaIndex(
+            categorical=categorical,
+            temporal=temporal,
+            fk_counts=fk_counts,
+            columns=columns,
+            main_fact=main_fact,
+            formatted_llm=self.llm._format_schema_for_llm(schema)
+        )
     
-    def _get_dashboard_recommendations(self, domain: str, entities: List[str]) -> List[str]:
+    def _get_dashboard_recommendations(self, domain: str, entities: List[str]) -> Sequence[str]:
         """Get dashboard recommendations based on business domain."""
-        recommendations = {
-            "e-commerce": [
-                "Sales Performance Dashboard",
-                "Customer Analytics Dashboard",
-                "Product Performance Dashboard",
-                "Order Fulfillment Dashboard"
-            ],
-            "finance": [
-                "Financial Overview Dashboard",
-                "Transaction Analysis Dashboard",
-                "Risk Analytics Dashboard",
-                "Portfolio Performance Dashboard"
-            ],
-            "healthcare": [
-                "Patient Analytics Dashboard",
-                "Clinical Operations Dashboard",
-                "Resource Utilization Dashboard",
-                "Quality Metrics Dashboard"
-            ],
-            "manufacturing": [
-                "Production Overview Dashboard",
-                "Quality Control Dashboard",
-                "Supply Chain Dashboard",
-                "Equipment Performance Dashboard"
-            ]
-        }
-        
-        return recommendations.get(domain.lower(), [
-            "Overview Dashboard",
-            "Analytics Dashboard",
-            "Performance Dashboard",
-            "Insights Dashboard"
-        ])
+        return _DASHBOARD_RECS.get(domain.lower(), _DEFAULT_DASHBOARDS)
     
     def _get_chart_config(self, chart_type: str, data: List[Dict], recommendation: Dict) -> Dict:
         """Get specific chart configuration."""
@@ -426,17 +832,11 @@ Provide 2-3 key insights in plain language that a business user would find valua
     
     def _map_intent_type(self, intent_str: str) -> QueryIntent:
         """Map string intent to QueryIntent enum."""
-        mapping = {
-            "overview": QueryIntent.OVERVIEW,
-            "aggregation": QueryIntent.AGGREGATION,
-            "distribution": QueryIntent.DISTRIBUTION,
-            "relationship": QueryIntent.RELATIONSHIP,
-            "time_series": QueryIntent.TIME_SERIES,
-            "comparison": QueryIntent.COMPARISON,
-            "ranking": QueryIntent.RANKING,
-            "detail": QueryIntent.DETAIL
-        }
-        return mapping.get(intent_str.lower(), QueryIntent.OVERVIEW)
+        # LLM responses are normally lowercase already, so try them as-is first
+        intent = _INTENT_MAPPING.get(intent_str)
+        if intent is None:
+            intent = _INTENT_MAPPING.get(intent_str.lower(), QueryIntent.OVERVIEW)
+        return intent
     
     def _create_fallback_query(self, intent: str, schema: Dict) -> QueryPlan:
         """Create a simple fallback query."""
@@ -467,13 +867,91 @@ Provide 2-3 key insights in plain language that a business user would find valua
             expected_columns=[col['name'] for col in table.get('columns', [])]
         )
     
+    def _analysis_key(self, schema_hash: str) -> str:
+        """Key for a persisted analysis; analyses depend on the model too."""
+        return f"{self._llm_kwargs['model']}|{schema_hash}"
+    
+    def _load_analysis(self, schema_hash: str) -> Optional[Dict[str, Any]]:
+        """Return a persisted, unexpired analysis for schema_hash, or None."""
+        if not self.cache_dir:
+            return None
+        try:
+            with shelve.open(os.path.join(self.cache_dir, "schema_analysis")) as store:
+                entry = store.get(self._analysis_key(schema_hash))
+        except Exception:
+            return None
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+    
+    def _store_analysis(self, schema_hash: str, analysis: Dict[str, Any]) -> None:
+        """Persist an analysis for _ANALYSIS_TTL seconds; failures are ignored."""
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with shelve.open(os.path.join(self.cache_dir, "schema_analysis")) as store:
+                store[self._analysis_key(schema_hash)] = (time.time() + _ANALYSIS_TTL, analysis)
+        except Exception:
+            pass
+    
+    def _cache_get(self, key: str) -> Optional[Any]:
+        """Return an unexpired cached plan or optimization, or None."""
+        entry = self._plan_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._plan_cache[key]
+            return None
+        return entry[1]
+    
+    def _cache_put(self, key: str, value: Any) -> None:
+        """Cache a plan or optimization for _PLAN_CACHE_TTL seconds."""
+        if len(self._plan_cache) >= _PLAN_CACHE_SIZE:
+            self._plan_cache.pop(next(iter(self._plan_cache)))
+        self._plan_cache[key] = (time.monotonic() + _PLAN_CACHE_TTL, value)
+    
+    def _similar_plan(self, schema_key: str, embedding) -> Optional[QueryPlan]:
+        """Find a cached plan for a near-identical intent on the same schema."""
+        entry = self._intent_embeddings.get(schema_key)
+        if embedding is None or not entry:
+            return None
+        
+        plan_keys, embeddings, matrix = entry
+        if matrix is None:
+            import numpy as np  # Available whenever embeddings are
+            matrix = entry[2] = np.stack(embeddings)
+        if matrix.shape[1] != embedding.shape[0]:
+            return None
+        
+        # Unit vectors, so one matrix-vector product gives every cosine similarity
+        scores = matrix @ embedding
+        best = int(scores.argmax())
+        if scores[best] < _INTENT_SIMILARITY:
+            return None
+        plan = self._cache_get(plan_keys[best])
+        return replace(plan, cache_hit=True) if plan is not None else None
+    
+    def _remember_intent(self, schema_key: str, embedding, plan_key: str) -> None:
+        """Record an intent embedding for _similar_plan lookups."""
+        entry = self._intent_embeddings.setdefault(schema_key, [[], [], None])
+        plan_keys, embeddings = entry[0], entry[1]
+        if embeddings and embeddings[0].shape != embedding.shape:
+            return
+        if len(plan_keys) >= _PLAN_CACHE_SIZE:
+            plan_keys.pop(0)
+            embeddings.pop(0)
+        plan_keys.append(plan_key)
+        embeddings.append(embedding)
+        entry[2] = None  # Restack on next lookup
+    
     def _hash_schema(self, schema: Dict) -> str:
         """Create a hash of the schema for caching."""
-        import hashlib
-        schema_str = json.dumps(schema, sort_keys=True)
-        return hashlib.md5(schema_str.encode()).hexdigest()
-    
-    def _get_timestamp(self) -> str:
-        """Get current timestamp."""
-        from datetime import datetime
-        return datetime.now().isoformat()
+        if orjson is not None:
+            try:
+                schema_bytes = orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)
+            except TypeError:
+                schema_bytes = json.dumps(schema, sort_keys=True).encode()
+        else:
+            schema_bytes = json.dumps(schema, sort_keys=True).encode()
+        return hashlib.blake2b(schema_bytes, digest_size=16).hexdigest()
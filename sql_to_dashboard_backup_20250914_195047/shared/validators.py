@@ -2,8 +2,21 @@
 
 import re
 import html
+from itertools import islice
 from typing import Optional, List, Dict, Any
 
+# Operations that shouldn't appear in schema definitions, as one alternation
+# so the DDL is scanned once. Matched against upper-cased text.
+_DANGEROUS_DDL_RE = re.compile(
+    r'\b(?:DROP\s+DATABASE|TRUNCATE|DELETE\s+FROM|UPDATE\s+.*?\s+SET'
+    r'|INSERT\s+INTO|EXEC(?:UTE)?|GRANT|REVOKE)\b'
+)
+
+# Mermaid ER checks. A relationship ("A ||--o{ B") sits on one line, so
+# only spaces and tabs may separate its parts.
+_ERDIAGRAM_RE = re.compile(r'^\s*erDiagram\b', re.MULTILINE)
+_MERMAID_RELATIONSHIP_RE = re.compile(r'\w+[ \t]+[|o\-{}]+[ \t]*[|o\-{}]+[ \t]+\w+')
+
 
 def validate_input_size(input_str: str, max_size: int = 100000) -> None:
     """
@@ -37,26 +50,12 @@ def validate_ddl_safety(ddl: str) -> None:
     """
     from .errors import SecurityError
     
-    # List of dangerous keywords that shouldn't appear in schema definitions
-    dangerous_patterns = [
-        r'\bDROP\s+DATABASE\b',
-        r'\bTRUNCATE\b',
-        r'\bDELETE\s+FROM\b',
-        r'\bUPDATE\s+.*\s+SET\b',
-        r'\bINSERT\s+INTO\b',
-        r'\bEXEC\b',
-        r'\bEXECUTE\b',
-        r'\bGRANT\b',
-        r'\bREVOKE\b',
-    ]
-    
-    ddl_upper = ddl.upper()
-    for pattern in dangerous_patterns:
-        if re.search(pattern, ddl_upper, re.IGNORECASE):
-            raise SecurityError(
-                "DDL contains potentially dangerous operations",
-                {'pattern': pattern}
-            )
+    match = _DANGEROUS_DDL_RE.search(ddl.upper())
+    if match:
+        raise SecurityError(
+            "DDL contains potentially dangerous operations",
+            {'pattern': match.group(0)}
+        )
 
 
 def sanitize_html(text: str) -> str:
@@ -99,13 +98,14 @@ def validate_json_data(data: Any, max_rows: int = 1000000) -> None:
         
         # Validate structure consistency
         if data and isinstance(data[0], dict):
-            first_keys = set(data[0].keys())
-            for i, row in enumerate(data[1:11], 1):  # Check first 10 rows
+            # Key views compare as sets without building one per row
+            first_keys = data[0].keys()
+            for i, row in enumerate(islice(data, 1, 11), 1):  # Check first 10 rows
                 if not isinstance(row, dict):
                     raise ValidationError(
                         f"Inconsistent data structure at row {i}: expected dict, got {type(row).__name__}"
                     )
-                if set(row.keys()) != first_keys:
+                if row.keys() != first_keys:
                     raise ValidationError(
                         f"Inconsistent keys at row {i}",
                         {'expected': list(first_keys), 'actual': list(row.keys())}
@@ -128,12 +128,11 @@ def validate_mermaid_syntax(mermaid: str) -> None:
         raise ValidationError("Mermaid diagram cannot be empty")
     
     # Check for ER diagram declaration
-    if not re.search(r'^\s*erDiagram\b', mermaid, re.MULTILINE):
+    if not _ERDIAGRAM_RE.search(mermaid):
         raise ValidationError("Mermaid input must start with 'erDiagram'")
     
     # Basic syntax checks for relationships
-    relationship_pattern = r'\w+\s+[|o\-\{\}]+\s*[|o\-\{\}]+\s+\w+'
-    if not re.search(relationship_pattern, mermaid):
+    if not _MERMAID_RELATIONSHIP_RE.search(mermaid):
         raise ValidationError("No valid entity relationships found in Mermaid diagram")
 
 
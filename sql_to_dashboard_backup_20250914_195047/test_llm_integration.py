@@ -2,10 +2,11 @@
 """Test script for LLM integration in SQL-to-Dashboard system."""
 
 import json
+import os
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
-import time
+from typing import Dict, Any, Optional, Tuple
 
 # Add current directory to path
 sys.path.append(str(Path(__file__).parent))
@@ -15,7 +16,44 @@ from ddl_parser_mcp.schema import DDLParserRequest, InputFormat
 from dashboard_generator_mcp.server import DashboardGeneratorMCPServer
 from dashboard_generator_mcp.schema import DashboardGeneratorRequest
 from llm.sql_intelligence import SQLIntelligenceAgent
-from llm.ollama_connector import OllamaConnector
+from llm.ollama_connector import (
+    OllamaConnector, _CircuitBreaker, _CircuitOpenError, _extract_first_json, _get_session,
+    _parse_first_json
+)
+
+# Model under test; point at a quantized tag (e.g. llama3:8b-instruct-q4_K_M)
+# for faster runs on CPU-only hosts
+_TEST_MODEL = os.environ.get("TEST_LLM_MODEL", "llama3")
+
+
+@lru_cache(maxsize=None)
+def _connector() -> OllamaConnector:
+    """Ollama connector shared by all tests."""
+    return OllamaConnector(model=_TEST_MODEL)
+
+
+@lru_cache(maxsize=None)
+def _agent() -> SQLIntelligenceAgent:
+    """SQL intelligence agent shared by all tests."""
+    return SQLIntelligenceAgent(llm_model=_TEST_MODEL)
+
+
+@lru_cache(maxsize=None)
+def _probe_ollama(base_url: str = "http://localhost:11434") -> Tuple[Optional[Tuple[str, ...]], str]:
+    """
+    Ask Ollama for its models once per base URL.
+    
+    Returns:
+        (model names, "") if Ollama answered, else (None, error description)
+    """
+    try:
+        # The connector's pooled session, so later tests reuse this connection
+        response = _get_session().get(f"{base_url}/api/tags", timeout=2)
+    except Exception as e:
+        return None, f"Cannot connect to Ollama: {e}"
+    if response.status_code != 200:
+        return None, "Ollama is not responding properly"
+    return tuple(m.get('name', 'Unknown') for m in response.json().get("models", [])), ""
 
 
 def print_header(title: str):
@@ -29,24 +67,235 @@ def test_ollama_connection():
     """Test if Ollama is running and accessible."""
     print_header("Testing Ollama Connection")
     
-    try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            print("✅ Ollama is running!")
-            print(f"📦 Available models: {len(models)}")
-            for model in models[:3]:  # Show first 3 models
-                print(f"   - {model.get('name', 'Unknown')}")
-            return True
-        else:
-            print("❌ Ollama is not responding properly")
-            return False
-    except Exception as e:
-        print(f"❌ Cannot connect to Ollama: {e}")
+    models, error = _probe_ollama()
+    if models is None:
+        print(f"❌ {error}")
         print("💡 Start Ollama with: ollama serve")
         print("   Then pull a model: ollama pull llama3")
         return False
+    
+    print("✅ Ollama is running!")
+    print(f"📦 Available models: {len(models)}")
+    for name in models[:3]:  # Show first 3 models
+        print(f"   - {name}")
+    return True
+
+
+def test_json_extraction():
+    """Test extraction of the first JSON object from LLM output."""
+    print_header("Testing JSON Extraction")
+    
+    response = 'Sure! {"query": "SELECT \'{x}\' AS a;", "tags": {"n": 1}} Also {"other": 2}'
+    assert _extract_first_json(response) == '{"query": "SELECT \'{x}\' AS a;", "tags": {"n": 1}}'
+    assert _extract_first_json('{"text": "quote \\" and } brace"}') == '{"text": "quote \\" and } brace"}'
+    assert _extract_first_json("no json here") is None
+    assert _extract_first_json('{"unterminated": 1') is None
+    assert _parse_first_json('Fill {placeholder} then {"a": [1, 2]}') == {"a": [1, 2]}
+    assert _parse_first_json("{not json} at all") is None
+    # An incomplete object must not yield the first object nested in it
+    assert _parse_first_json('{"results": [{"query": "SELECT 1;"}, {"query": ') is None
+    assert _parse_first_json('{"a": {"b": 1}') is None
+    assert _parse_first_json('{x {"inner": 1} y} then {"outer": 2}') == {"outer": 2}
+    
+    print("✅ JSON extraction handles nested, quoted and trailing objects")
+    return True
+
+
+def test_circuit_breaker():
+    """Test that repeated failures make the connector fail fast."""
+    print_header("Testing Circuit Breaker")
+    
+    breaker = _CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.check()  # Still closed below the threshold
+    breaker.record_failure()
+    try:
+        breaker.check()
+        raise AssertionError("breaker did not open")
+    except _CircuitOpenError:
+        pass
+    breaker.record_success()
+    breaker.check()
+    
+    # After the cool-down exactly one probe gets through
+    breaker = _CircuitBreaker(threshold=1, cooldown=0)
+    breaker.record_failure()
+    breaker.check()
+    try:
+        breaker.check()
+        raise AssertionError("second caller passed while the probe was in flight")
+    except _CircuitOpenError:
+        pass
+    breaker.record_failure()
+    breaker.check()  # The failed probe reopened the breaker; next cool-down, next probe
+    breaker.record_success()
+    breaker.check()
+    breaker.check()
+    
+    print("✅ Circuit breaker opens after repeated failures, probes once, closes on success")
+    return True
+
+
+def test_response_cache():
+    """Test that only usable replies are served from the exact-match cache."""
+    print_header("Testing Response Cache")
+    
+    # A server of its own, so no other test shares these cache entries
+    connector = OllamaConnector(model=_TEST_MODEL, base_url="http://cache-test.invalid")
+    replies = ['Use the {placeholder} format.', '{"business_domain": "retail"}']
+    calls = []
+    connector._call_ollama = lambda *args: calls.append(args) or replies[len(calls) - 1]
+    
+    prompt = "Describe the schema"
+    assert connector.generate(prompt, stop_at_json=True, json_mode=True) == replies[0]
+    assert connector.generate(prompt, stop_at_json=True, json_mode=True) == replies[1]
+    assert connector.generate(prompt, stop_at_json=True, json_mode=True) == replies[1]
+    assert len(calls) == 2, "unparseable reply was cached or parsed reply was not"
+    
+    # The semantic tier compares only the request-specific text, and only
+    # between requests whose remaining prompt and settings match exactly
+    class _Embedding:
+        shape = (1,)
+        
+        def __init__(self, text):
+            self.text = text
+        
+        def dot(self, other):
+            return 1.0 if other.text.lower() == self.text.lower() else 0.0
+    
+    connector = OllamaConnector(model=_TEST_MODEL, base_url="http://semantic-test.invalid",
+                                enable_semantic_cache=True)
+    connector._embed = _Embedding
+    calls = []
+    connector._call_ollama = lambda *args: calls.append(args) or f'{{"n": {len(calls)}}}'
+    
+    first = connector.generate("Schema: t\nIntent: Top products", stop_at_json=True,
+                               semantic_text="Top products")
+    assert connector.generate("Schema: t\nIntent: top products", stop_at_json=True,
+                              semantic_text="top products") == first
+    connector.generate("Schema: t\nIntent: top products", stop_at_json=True, max_tokens=64,
+                       semantic_text="top products")
+    connector.generate("Schema: u\nIntent: top products", stop_at_json=True,
+                       semantic_text="top products")
+    assert len(calls) == 3, f"semantic cache crossed settings or schemas: {len(calls)} calls"
+    
+    print("✅ Unparseable JSON replies are retried, parsed ones are cached")
+    return True
+
+
+def test_stream_handling():
+    """Test where streamed generations end: on errors and at the first JSON object."""
+    print_header("Testing Stream Handling")
+    
+    def failing_stream(*args):
+        yield "Revenue grew"
+        raise ConnectionError("connection reset")
+    
+    connector = OllamaConnector(model=_TEST_MODEL, base_url="http://stream-test.invalid")
+    connector._stream_pieces = failing_stream
+    pieces = list(connector.generate_stream("Summarize the results"))
+    assert pieces[0] == "Revenue grew"
+    assert pieces[-1].startswith("Error:"), f"no error marker after partial output: {pieces}"
+    
+    # stop_at_json must not stop at a brace pair that is not JSON
+    connector._stream_pieces = lambda *args: (piece for piece in [
+        'Use the {placeholder} format. ', '{"business_domain": ', '"retail"}', ' and more'
+    ])
+    response = connector.generate("Describe the schema", stop_at_json=True, json_mode=True)
+    assert response == 'Use the {placeholder} format. {"business_domain": "retail"}', response
+    
+    # ...nor at the first nested object of an object that is still open
+    connector._stream_pieces = lambda *args: (piece for piece in [
+        '{"results": [{"query": "SELECT 1;"}', ', {"query": "SELECT 2;"}]}', ' and more'
+    ])
+    response = connector.generate("List the queries", stop_at_json=True, json_mode=True)
+    assert _parse_first_json(response) == {"results": [{"query": "SELECT 1;"}, {"query": "SELECT 2;"}]}
+    
+    print("✅ Partial streams end with an error piece; stop_at_json waits for real JSON")
+    return True
+
+
+def test_schema_format_fallback():
+    """Test that servers rejecting JSON-schema formats get plain JSON mode instead."""
+    print_header("Testing Schema Format Fallback")
+    
+    import requests
+    import llm.ollama_connector as ollama_connector
+    
+    class _Response:
+        def __init__(self, status_code, lines=()):
+            self.status_code, self.lines = status_code, lines
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc_info):
+            self.close()
+        
+        def close(self):
+            pass
+        
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise requests.HTTPError(f"{self.status_code} error", response=self)
+        
+        def iter_lines(self):
+            return iter(self.lines)
+    
+    class _OldOllama:
+        """Answers 400 to schema formats, like Ollama before 0.5."""
+        formats = []
+        
+        def post(self, url, json, **kwargs):
+            self.formats.append(json.get("format"))
+            if isinstance(json.get("format"), dict):
+                return _Response(400)
+            return _Response(200, [b'{"response": "{\\"query\\": \\"SELECT 1;\\"}", "done": true}'])
+    
+    session = _OldOllama()
+    base_url = "http://old-ollama.invalid"
+    original_get_session = ollama_connector._get_session
+    ollama_connector._get_session = lambda: session
+    try:
+        connector = OllamaConnector(model=_TEST_MODEL, base_url=base_url)
+        for prompt in ("First query", "Second query"):
+            response = connector.generate(prompt, stop_at_json=True, json_schema={"type": "object"})
+            assert _parse_first_json(response) == {"query": "SELECT 1;"}, response
+        assert session.formats[1:] == ["json", "json"], session.formats
+        
+        # Rejected requests prove the server is up; they must not open the breaker
+        session.post = lambda url, json, **kwargs: _Response(400)
+        for attempt in range(ollama_connector._BREAKER_THRESHOLD + 1):
+            assert connector.generate(f"Bad request {attempt}").startswith("Error: Ollama request failed")
+        ollama_connector._server_breaker(base_url).check()
+    finally:
+        ollama_connector._get_session = original_get_session
+    
+    print("✅ Schema formats fall back to JSON mode; 4xx responses do not trip the breaker")
+    return True
+
+
+def test_template_plans():
+    """Test that template plans quote names that are reserved words."""
+    print_header("Testing Template Plans")
+    
+    import sqlite3
+    
+    schema = {"tables": [{"name": "order", "columns": [
+        {"name": "count", "type": "varchar(10)"}, {"name": "user", "type": "varchar(20)"}
+    ]}]}
+    plans = SQLIntelligenceAgent(llm_model=_TEST_MODEL).generate_queries_from_intents(
+        ["Show overview statistics for order", "Show distribution of count in order"], schema
+    )
+    
+    connection = sqlite3.connect(":memory:")
+    connection.execute('CREATE TABLE "order" ("count" VARCHAR(10), "user" VARCHAR(20))')
+    for plan in plans:
+        assert plan.confidence == 0.95, f"not a template plan: {plan.query}"
+        connection.execute(plan.query).fetchall()
+    
+    print("✅ Template plans run against tables and columns named like keywords")
+    return True
 
 
 def test_llm_connector():
@@ -54,7 +303,7 @@ def test_llm_connector():
     print_header("Testing LLM Connector")
     
     try:
-        connector = OllamaConnector(model="llama3")
+        connector = _connector()
         
         # Test basic generation
         prompt = "What is SQL? Answer in one sentence."
@@ -131,7 +380,7 @@ def test_schema_analysis():
     }
     
     try:
-        agent = SQLIntelligenceAgent()
+        agent = _agent()
         analysis = agent.analyze_business_context(schema)
         
         print("✅ Schema analysis complete!")
@@ -195,7 +444,7 @@ def test_natural_language_query():
     ]
     
     try:
-        agent = SQLIntelligenceAgent()
+        agent = _agent()
         
         print("🔄 Converting natural language queries to SQL:\n")
         
@@ -240,7 +489,7 @@ def test_visualization_recommendation():
     }
     
     try:
-        connector = OllamaConnector()
+        connector = _connector()
         recommendation = connector.recommend_visualization(sample_data, query_metadata)
         
         print("✅ Visualization recommendation complete!")
@@ -299,7 +548,7 @@ def test_enhanced_ddl_parser():
     try:
         # Test with LLM
         print("\n🤖 Testing with LLM enhancement...")
-        server_with_llm = EnhancedDDLParserMCPServer(use_llm=True)
+        server_with_llm = EnhancedDDLParserMCPServer(use_llm=True, llm_model=_TEST_MODEL)
         
         request = DDLParserRequest(
             task="parse_schema",
@@ -363,6 +612,12 @@ def run_all_tests():
     
     tests = [
         ("Ollama Connection", test_ollama_connection),
+        ("JSON Extraction", test_json_extraction),
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Response Cache", test_response_cache),
+        ("Stream Handling", test_stream_handling),
+        ("Schema Format Fallback", test_schema_format_fallback),
+        ("Template Plans", test_template_plans),
         ("LLM Connector", test_llm_connector),
         ("Schema Analysis", test_schema_analysis),
         ("Natural Language Query", test_natural_language_query),
@@ -376,7 +631,6 @@ def run_all_tests():
         try:
             result = test_func()
             results.append((test_name, result))
-            time.sleep(1)  # Small delay between tests
         except Exception as e:
             print(f"❌ Test '{test_name}' crashed: {e}")
             results.append((test_name, False))
@@ -3,13 +3,14 @@
 
 import json
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 # Add current directory to path
 sys.path.append(str(Path(__file__).parent))
 
 from ddl_parser_mcp.server import DDLParserMCPServer
-from ddl_parser_mcp.schema import DDLParserRequest, InputFormat
+from ddl_parser_mcp.schema import DDLParserRequest, DDLParserResponse, InputFormat
 from dashboard_generator_mcp.server import DashboardGeneratorMCPServer
 from dashboard_generator_mcp.schema import (
     DashboardGeneratorRequest,
@@ -20,6 +21,18 @@ from dashboard_generator_mcp.schema import (
 )
 
 
+@lru_cache(maxsize=None)
+def _parser_server() -> DDLParserMCPServer:
+    """DDL parser server shared by all tests."""
+    return DDLParserMCPServer()
+
+
+@lru_cache(maxsize=None)
+def _dashboard_server() -> DashboardGeneratorMCPServer:
+    """Dashboard generator server shared by all tests."""
+    return DashboardGeneratorMCPServer()
+
+
 def test_workflow():
     """Test the complete workflow."""
     
@@ -33,7 +46,7 @@ def test_workflow():
         ddl_content = f.read()
     
     # Create parser server
-    parser_server = DDLParserMCPServer()
+    parser_server = _parser_server()
     
     # Create request
     parse_request = DDLParserRequest(
@@ -77,7 +90,7 @@ def test_workflow():
         product_data = json.load(f)
     
     # Create dashboard server
-    dashboard_server = DashboardGeneratorMCPServer()
+    dashboard_server = _dashboard_server()
     
     # Create focused, high-quality chart configurations
     charts = [
@@ -178,5 +191,33 @@ def test_workflow():
     print("\n✨ Workflow test completed!")
 
 
+def test_parser_response_round_trip():
+    """Responses built with model_construct must match a fully validated copy."""
+    parser_server = _parser_server()
+    response = parser_server.handle_request(DDLParserRequest(
+        task="parse_schema",
+        input="""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR(100));
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        );
+        """,
+        format=InputFormat.DDL,
+        visualization_intents=["overview"]
+    ))
+    
+    assert response.status == "success"
+    validated = DDLParserResponse.model_validate_json(response.model_dump_json())
+    assert validated == response
+    assert json.loads(parser_server.process_json_request(json.dumps({
+        "task": "parse_schema",
+        "input": "CREATE TABLE t (id INTEGER PRIMARY KEY);",
+        "format": "ddl"
+    })))["status"] == "success"
+
+
 if __name__ == "__main__":
     test_workflow()
+    test_parser_response_round_trip()